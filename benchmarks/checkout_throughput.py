@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""Compare checkout throughput of the WSGI and ASGI deployments.
+
+Starts the Stripe stand-in (store/fake_stripe.py) with a configurable latency
+distribution, then drives POST /create-checkout-session/ against one or
+both running deployments at a fixed concurrency.
+
+Start the deployments against the simulated Stripe first, e.g.:
+
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_SECRET_KEY=sk_test_bench \\
+        gunicorn stripe_app.wsgi -w 1 --threads 8 -b 127.0.0.1:8000
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_SECRET_KEY=sk_test_bench STORE_ASYNC_VIEWS=True \\
+        uvicorn stripe_app.asgi:application --workers 1 --port 8001
+
+then run:
+
+    python benchmarks/checkout_throughput.py --wsgi-url http://127.0.0.1:8000 \\
+        --asgi-url http://127.0.0.1:8001 --latency 0.3 --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from store.fake_stripe import FakeStripe, start_server  # noqa: E402
+
+
+# Consecutive carts get distinct quantities, so duplicate detection never short-circuits a
+# checkout; kept small so order totals stay within Order.total_amount's digits
+_quantities = (n % 2000 + 1 for n in itertools.count(int(time.time())))
+
+
+async def run_load(base_url, product_id, total_requests, concurrency):
+    """POST total_requests checkouts with at most `concurrency` in flight. Returns (ok, errors, seconds)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    ok = errors = 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await client.get('/')  # sets the csrftoken cookie
+        csrf_token = client.cookies.get('csrftoken')
+
+        async def one():
+            nonlocal ok, errors
+            async with semaphore:
+                response = await client.post(
+                    '/create-checkout-session/',
+                    json={'items': [{'product_id': product_id, 'quantity': next(_quantities)}]},
+                    headers={'X-CSRFToken': csrf_token, 'Referer': base_url},
+                )
+                if response.status_code == 200:
+                    ok += 1
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total_requests)))
+        return ok, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--wsgi-url', help='Base URL of the WSGI deployment')
+    parser.add_argument('--asgi-url', help='Base URL of the ASGI deployment')
+    parser.add_argument('--stripe-port', type=int, default=12111, help='Port for the simulated Stripe API')
+    parser.add_argument('--latency', default='0.3',
+                        help='Simulated Stripe latency: seconds or a distribution such as lognormal:0.3,0.5')
+    parser.add_argument('--requests', type=int, default=200, help='Checkouts per deployment')
+    parser.add_argument('--concurrency', type=int, default=50, help='Checkouts in flight at once')
+    parser.add_argument('--product-id', type=int, default=1, help='Product to put in every cart')
+    args = parser.parse_args()
+
+    if not args.wsgi_url and not args.asgi_url:
+        parser.error('give --wsgi-url and/or --asgi-url')
+
+    fake = FakeStripe(latency=args.latency)
+    server = start_server(fake, port=args.stripe_port)
+    print(f'Simulated Stripe on {fake.base_url} (latency {args.latency})')
+
+    for name, url in (('WSGI', args.wsgi_url), ('ASGI', args.asgi_url)):
+        if not url:
+            continue
+        ok, errors, seconds = asyncio.run(run_load(url, args.product_id, args.requests, args.concurrency))
+        print(f'{name}: {ok} ok, {errors} errors in {seconds:.2f}s -> {ok / seconds:.1f} checkouts/s')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
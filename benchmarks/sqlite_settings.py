@@ -0,0 +1,23 @@
+"""Settings the committed benchmarks/baseline.json is recorded with.
+
+The app itself runs on PostgreSQL; this swaps in SQLite so the baseline can be
+recorded and compared on any machine without a database server:
+
+    DJANGO_SETTINGS_MODULE=benchmarks.sqlite_settings \
+        python manage.py benchmark_storefront --compare benchmarks/baseline.json
+
+Record and compare on the same machine; query counts are what carries over.
+"""
+from stripe_app.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'benchmark.sqlite3',  # noqa: F405
+        # The benchmark clients write concurrently; wait for the lock instead of failing
+        'OPTIONS': {'timeout': 30},
+        # A file rather than :memory:, so every client thread sees the same database
+        'TEST': {'NAME': BASE_DIR / 'benchmark_test.sqlite3'},  # noqa: F405
+    },
+}
+DATABASE_REPLICAS = []
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, Order, OrderItem
+from .models import ArchivedOrder, DailyProductSales, DailySales, Product, Order, OrderItem
 
 
 @admin.register(Product)
@@ -17,7 +17,7 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'status', 'total_amount', 'created_at', 'stripe_session_id']
+    list_display = ['id', 'status', 'item_count', 'total_amount', 'created_at', 'stripe_session_id']
     list_filter = ['status', 'created_at']
     readonly_fields = ['stripe_session_id', 'stripe_payment_intent_id', 'created_at', 'updated_at', 'idempotency_key']
     inlines = [OrderItemInline]
@@ -25,3 +25,37 @@ class OrderAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return False  # Orders should only be created through the payment flow
 
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'total_amount', 'created_at', 'archived_at', 'stripe_session_id']
+    list_filter = ['status', 'created_at']
+    search_fields = ['id', 'stripe_session_id', 'stripe_payment_intent_id']
+    
+    def has_add_permission(self, request):
+        return False  # Rows are written by archive_orders
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class RollupAdmin(admin.ModelAdmin):
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False  # Rows are written by rollup_sales
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(RollupAdmin):
+    list_display = ['date', 'orders', 'units', 'revenue']
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(RollupAdmin):
+    list_display = ['date', 'product', 'orders', 'units', 'revenue']
+    list_filter = ['product']
+    list_select_related = ['product']
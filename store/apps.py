@@ -5,3 +5,8 @@ class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import metrics, stripe_gateway
+        # Every process that calls Stripe (web workers and management commands) records the calls
+        stripe_gateway.add_observer(metrics.record_stripe_call)
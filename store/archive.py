@@ -0,0 +1,124 @@
+"""Moving settled orders out of the hot Order/OrderItem tables.
+
+``archive_orders`` takes settled (paid, failed, cancelled) orders older than a
+cutoff, oldest first, and in one transaction per batch copies each of them into
+ArchivedOrder (one row, items inline) and deletes the order, its items and its
+outbox row. Pending orders are never archived, so the webhook worker and the
+reconciler only ever see the Order table.
+
+With an export directory, every archived order is also appended as one JSON
+line to ``orders-YYYY-MM.jsonl.gz`` for its creation month. The files are
+appended per batch (each run adds gzip members, which gzip/zcat read as one
+stream); the ArchivedOrder table stays the source of truth.
+
+This stands in for native PostgreSQL partitioning of Order, which would need
+the partition key (created_at) in the primary key and in every unique
+constraint. That breaks the single-column foreign keys from OrderItem and
+CheckoutOutbox, and the unique stripe_session_id, stripe_payment_intent_id and
+idempotency_key constraints that the double-charge protection relies on.
+"""
+import gzip
+import json
+import os
+
+from django.db import transaction
+
+from .models import ArchivedOrder, Order, OrderItem
+
+SETTLED_STATUSES = ('paid', 'failed', 'cancelled')
+
+
+def archive_candidates(cutoff, batch_size):
+    """The oldest batch_size settled orders created before cutoff."""
+    return (
+        Order.objects.filter(status__in=SETTLED_STATUSES, created_at__lt=cutoff)
+        .order_by('created_at', 'id')[:batch_size]
+    )
+
+
+def archive_batch(cutoff, batch_size=1000):
+    """Archive up to batch_size settled orders created before cutoff. Returns the ArchivedOrder rows."""
+    with transaction.atomic():
+        orders = list(archive_candidates(cutoff, batch_size))
+        if not orders:
+            return []
+        items = {}
+        for order_id, product_id, name, quantity, price in (
+            OrderItem.objects.filter(order__in=[order.id for order in orders])
+            .order_by('order_id', 'id')
+            .values_list('order_id', 'product_id', 'product__name', 'quantity', 'price')
+        ):
+            items.setdefault(order_id, []).append({
+                'product_id': product_id,
+                'name': name,
+                'quantity': quantity,
+                'price': str(price),
+            })
+        archived = [
+            ArchivedOrder(
+                id=order.id,
+                user_id=order.user_id,
+                status=order.status,
+                total_amount=order.total_amount,
+                created_at=order.created_at,
+                updated_at=order.updated_at,
+                stripe_session_id=order.stripe_session_id or '',
+                stripe_payment_intent_id=order.stripe_payment_intent_id or '',
+                items=items.get(order.id, []),
+            )
+            for order in orders
+        ]
+        # ignore_conflicts: a batch interrupted after the copy is simply copied again
+        ArchivedOrder.objects.bulk_create(archived, ignore_conflicts=True)
+        Order.objects.filter(id__in=[order.id for order in orders]).delete()
+    return archived
+
+
+def export_record(archived):
+    return {
+        'id': archived.id,
+        'user_id': archived.user_id,
+        'status': archived.status,
+        'total_amount': str(archived.total_amount),
+        'created_at': archived.created_at.isoformat(),
+        'updated_at': archived.updated_at.isoformat(),
+        'stripe_session_id': archived.stripe_session_id,
+        'stripe_payment_intent_id': archived.stripe_payment_intent_id,
+        'items': archived.items,
+    }
+
+
+def export(archived, export_dir):
+    """Append archived orders to their month's gzip JSONL file in export_dir. Returns the paths written."""
+    by_month = {}
+    for order in archived:
+        by_month.setdefault(order.created_at.strftime('%Y-%m'), []).append(order)
+    paths = []
+    for month, orders in sorted(by_month.items()):
+        path = os.path.join(export_dir, f'orders-{month}.jsonl.gz')
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for order in orders:
+                f.write(json.dumps(export_record(order)) + '\n')
+        paths.append(path)
+    return paths
+
+
+def archive_orders(cutoff, batch_size=1000, export_dir=None, progress=None):
+    """Archive every settled order created before cutoff, batch by batch.
+
+    `progress` is called with the running totals after every batch.
+    Returns {'archived': ..., 'batches': ..., 'files': [...]}.
+    """
+    totals = {'archived': 0, 'batches': 0, 'files': []}
+    while True:
+        archived = archive_batch(cutoff, batch_size)
+        if not archived:
+            return totals
+        if export_dir:
+            for path in export(archived, export_dir):
+                if path not in totals['files']:
+                    totals['files'].append(path)
+        totals['archived'] += len(archived)
+        totals['batches'] += 1
+        if progress:
+            progress(totals)
@@ -0,0 +1,191 @@
+"""Storefront load scenarios for the ``benchmark_storefront`` command.
+
+Requests go through Django's test client on worker threads (one client and one
+database connection per thread), so each sample covers URL routing,
+middleware, views, templates, the database and the Stripe stand-in. The HTTP
+server is not included; ``benchmarks/checkout_throughput.py`` covers that.
+"""
+from collections import namedtuple
+from decimal import Decimal
+import itertools
+import json
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .fake_stripe import public, sign_payload
+from .models import Order, OrderItem, Product, order_items_summary
+
+Scenario = namedtuple('Scenario', ['name', 'request', 'client_factory'])
+
+BENCH_USERNAME = 'benchmark-user'
+
+
+def run_scenario(scenario, total, concurrency):
+    """Send `total` requests from `concurrency` threads. Returns the scenario's stats dict."""
+    indexes = itertools.count()
+    lock = threading.Lock()
+    samples = []
+
+    def worker(client):
+        try:
+            while True:
+                with lock:
+                    i = next(indexes)
+                if i >= total:
+                    return
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = scenario.request(client, i)
+                    elapsed = time.perf_counter() - started
+                samples.append((elapsed, len(queries), response.status_code < 400))
+        finally:
+            connection.close()
+
+    # Clients (and their logins) are set up before the clock starts
+    threads = [threading.Thread(target=worker, args=(scenario.client_factory(),)) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started)
+
+
+def summarize(samples, wall_seconds):
+    latencies = sorted(elapsed for elapsed, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+        'throughput_rps': round(len(samples) / wall_seconds, 1),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+        'max_queries': max(queries),
+    }
+
+
+def prepare_catalog(product_count):
+    """Make sure at least product_count products exist. Returns their ids."""
+    missing = product_count - Product.objects.count()
+    if missing > 0:
+        Product.objects.bulk_create([
+            Product(name=f'Benchmark product {n}', description='Benchmark product', price=Decimal('10.00'))
+            for n in range(missing)
+        ])
+    return list(Product.objects.order_by('id').values_list('id', flat=True)[:product_count])
+
+
+def prepare_user(history, product_ids):
+    """Create the benchmark user with `history` paid orders of three items each."""
+    user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+    existing = Order.objects.filter(user=user, status='paid').count()
+    names = dict(Product.objects.filter(id__in=product_ids[:3]).values_list('id', 'name'))
+    summary = order_items_summary([(names[product_id], 1, Decimal('10.00')) for product_id in product_ids[:3]])
+    orders = Order.objects.bulk_create([
+        Order(user=user, status='paid', total_amount=Decimal('30.00'), idempotency_key=str(uuid.uuid4()),
+              item_count=len(summary), items_summary=summary)
+        for _ in range(max(history - existing, 0))
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=product_id, quantity=1, price=Decimal('10.00'))
+        for order in orders
+        for product_id in product_ids[:3]
+    ])
+    return user
+
+
+def prepare_paid_sessions(fake, count, product_ids):
+    """Create `count` pending orders whose stand-in sessions are already paid. Returns the sessions."""
+    sessions = []
+    product = Product.objects.get(id=product_ids[0])
+    summary = order_items_summary([(product.name, 1, Decimal('10.00'))])
+    for _ in range(count):
+        order = Order.objects.create(status='pending', total_amount=Decimal('10.00'),
+                                     idempotency_key=str(uuid.uuid4()), item_count=1, items_summary=summary)
+        OrderItem.objects.create(order=order, product_id=product_ids[0], quantity=1, price=Decimal('10.00'))
+        session = fake.create_session({
+            'metadata': {'order_id': str(order.id)},
+            'success_url': 'http://testserver/success?session_id={CHECKOUT_SESSION_ID}',
+        })
+        Order.objects.filter(id=order.id).update(stripe_session_id=session['id'])
+        sessions.append(fake.complete_session(session['id']))
+    return sessions
+
+
+def anonymous_client():
+    # Server errors count as failed requests instead of stopping the worker
+    return Client(raise_request_exception=False)
+
+
+def authenticated_client_factory(user):
+    def factory():
+        client = anonymous_client()
+        client.force_login(user)
+        return client
+    return factory
+
+
+def checkout_request(product_ids, cart_size):
+    offset = int(time.time())
+
+    def request(client, i):
+        # A distinct first quantity per request keeps the duplicate-cart check from answering
+        items = [{'product_id': product_id, 'quantity': 1} for product_id in product_ids[:cart_size]]
+        items[0]['quantity'] = 1 + (offset + i) % 1000
+        return client.post('/create-checkout-session/', data=json.dumps({'items': items}),
+                           content_type='application/json')
+    return request
+
+
+def success_request(sessions):
+    return lambda client, i: client.get('/success/', {'session_id': sessions[i % len(sessions)]['id']})
+
+
+def webhook_request(sessions, secret):
+    def request(client, i):
+        event = {
+            'id': f'evt_bench_{uuid.uuid4().hex}',
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'created': int(time.time()),
+            'livemode': False,
+            'data': {'object': public(sessions[i % len(sessions)])},
+        }
+        payload = json.dumps(event)
+        return client.post('/webhook/', data=payload, content_type='application/json',
+                           HTTP_STRIPE_SIGNATURE=sign_payload(payload, secret))
+    return request
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against a saved baseline."""
+    regressions = []
+    for name, base in baseline.get('scenarios', {}).items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {current["p95_ms"]} ms vs {base["p95_ms"]} ms baseline')
+        if current['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f'{name}: throughput {current["throughput_rps"]}/s vs {base["throughput_rps"]}/s baseline'
+            )
+        # Query counts are deterministic, so any increase is a regression
+        if current['queries_per_request'] > base['queries_per_request'] + 0.5:
+            regressions.append(
+                f'{name}: {current["queries_per_request"]} queries/request vs '
+                f'{base["queries_per_request"]} baseline'
+            )
+        if current['errors'] > base['errors']:
+            regressions.append(f'{name}: {current["errors"]} errors vs {base["errors"]} baseline')
+    return regressions
@@ -0,0 +1,66 @@
+"""In-process product catalog cache used by checkout.
+
+Products are fetched in one ``id__in`` query and kept per process. The cache is
+tagged with a catalog version stored in Django's cache; ``Product`` save/delete
+signals bump the version, which makes every process drop its snapshot on the
+next lookup. With more than one worker process, point the default cache at a
+shared backend so the version is shared too. Snapshots are also dropped after
+CATALOG_SNAPSHOT_TTL seconds, which bounds staleness when a bump does not reach
+a process (a per-process cache, or a write that bypasses the signals).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product
+
+VERSION_CACHE_KEY = 'store:catalog-version'
+
+_lock = threading.Lock()
+_snapshot_version = None
+_snapshot_loaded_at = 0.0
+_snapshot = {}
+
+
+def current_version():
+    """Return the current catalog version, creating one if the cache has none."""
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def bump_version():
+    """Invalidate every process's catalog snapshot."""
+    cache.set(VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+
+
+def get_products(product_ids):
+    """Return {id: Product} for the given ids, skipping ids that do not exist.
+
+    Costs at most one query, and none when every product is already cached
+    for the current catalog version.
+    """
+    global _snapshot_version, _snapshot_loaded_at, _snapshot
+
+    version = current_version()
+    with _lock:
+        now = time.monotonic()
+        if _snapshot_version != version or now - _snapshot_loaded_at > settings.CATALOG_SNAPSHOT_TTL:
+            _snapshot_version = version
+            _snapshot_loaded_at = now
+            _snapshot = {}
+        products = _snapshot
+        missing = [pid for pid in set(product_ids) if pid not in products]
+
+    if missing:
+        fetched = Product.objects.in_bulk(missing)
+        with _lock:
+            if _snapshot_version == version:
+                _snapshot.update(fetched)
+        products = {**products, **fetched}
+
+    return {pid: products[pid] for pid in product_ids if pid in products}
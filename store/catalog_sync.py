@@ -0,0 +1,129 @@
+"""Keep Stripe Products and Prices in step with the catalog.
+
+``sync_catalog`` only touches products that changed since their last sync:
+
+- no Stripe Product yet: create it together with its default Price (one call);
+- price changed: create a new Price, make it the default and archive the old
+  one (Stripe Prices are immutable);
+- name, description or image changed: update the Stripe Product.
+
+Stripe calls run on a rate-limited thread pool; create calls carry idempotency
+keys derived from the product, its content and (for Prices) the Price being
+replaced, so re-running after a crash does not create duplicates. Results are
+written back with one bulk_update and the catalog cache version is bumped so
+checkout picks up the new Price ids.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import stripe_gateway
+from .catalog import bump_version
+from .models import Product
+from .reconciliation import TokenBucket
+
+
+def unit_amount(price):
+    """Price in the currency's smallest unit (paise for INR)."""
+    return int(price * 100)
+
+
+def needs_sync(product):
+    return (
+        not product.stripe_product_id
+        or not product.synced_price_id()
+        or product.stripe_synced_hash != product.stripe_content_hash()
+    )
+
+
+def _product_fields(product):
+    fields = {
+        'name': product.name,
+        'description': product.description[:500] or None,  # same limit as checkout line items
+        'metadata': {'product_id': str(product.id)},
+    }
+    if product.image_url:
+        fields['images'] = [product.image_url]
+    return fields
+
+
+def sync_product(product, bucket, force=False):
+    """Bring one product's Stripe objects up to date. Returns (product, action, error); product is updated in place."""
+    content_hash = product.stripe_content_hash()
+    amount = unit_amount(product.price)
+    try:
+        if not product.stripe_product_id:
+            bucket.acquire()
+            stripe_product = stripe_gateway.create_product(
+                idempotency_key=f'catalog-product-{product.id}-{amount}-{content_hash[:16]}',
+                default_price_data={'currency': settings.STORE_CURRENCY, 'unit_amount': amount},
+                **_product_fields(product),
+            )
+            product.stripe_product_id = stripe_product.id
+            product.stripe_price_id = stripe_product.default_price
+            product.stripe_synced_price = product.price
+            product.stripe_synced_hash = content_hash
+            return product, 'created', None
+
+        action = 'updated'
+        changes = {}
+        if not product.synced_price_id():
+            bucket.acquire()
+            # Keyed on the Price being replaced as well, so going back to an earlier amount
+            # creates a new Price instead of replaying the one archived since
+            price = stripe_gateway.create_price(
+                idempotency_key=f'catalog-price-{product.id}-{amount}-{product.stripe_price_id or "none"}',
+                product=product.stripe_product_id,
+                currency=settings.STORE_CURRENCY,
+                unit_amount=amount,
+            )
+            changes['default_price'] = price.id
+            action = 'repriced'
+        if force or product.stripe_synced_hash != content_hash:
+            changes.update(_product_fields(product))
+        if changes:
+            bucket.acquire()
+            stripe_gateway.modify_product(product.stripe_product_id, **changes)
+        if 'default_price' in changes:
+            if product.stripe_price_id:
+                # Archive the old Price so it cannot be used for new checkouts
+                bucket.acquire()
+                stripe_gateway.modify_price(product.stripe_price_id, active=False)
+            product.stripe_price_id = changes['default_price']
+            product.stripe_synced_price = product.price
+        product.stripe_synced_hash = content_hash
+        return product, action, None
+    except Exception as e:
+        return product, None, e
+
+
+def sync_catalog(workers=4, rate=20, force=False, progress=None):
+    """Sync every product that changed since its last sync (all products with force).
+
+    `progress` is called with (product, action, error) for each product synced.
+    Returns {'checked': ..., 'created': ..., 'repriced': ..., 'updated': ..., 'errors': ...}.
+    """
+    products = list(Product.objects.all())
+    stale = [product for product in products if force or needs_sync(product)]
+    totals = {'checked': len(products), 'created': 0, 'repriced': 0, 'updated': 0, 'errors': 0}
+    if not stale:
+        return totals
+
+    bucket = TokenBucket(rate)
+    synced = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for product, action, error in pool.map(lambda product: sync_product(product, bucket, force), stale):
+            if error is None:
+                synced.append(product)
+                totals[action] += 1
+            else:
+                totals['errors'] += 1
+            if progress:
+                progress(product, action, error)
+
+    if synced:
+        Product.objects.bulk_update(
+            synced, ['stripe_product_id', 'stripe_price_id', 'stripe_synced_price', 'stripe_synced_hash']
+        )
+        bump_version()
+    return totals
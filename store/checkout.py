@@ -0,0 +1,150 @@
+"""Order write path for checkout.
+
+Checkout runs in two short transactions with the Stripe call in between:
+
+1. ``create_pending_order`` inserts the order, its items (one bulk INSERT) and
+   a ``CheckoutOutbox`` row describing the session to create.
+2. ``send_checkout_session`` calls Stripe with no transaction open, then
+   records the session id (or the failure) in a second short transaction.
+
+Outbox rows left pending by a crash or a network error are retried by the
+``sweep_checkout_outbox`` command. Retries reuse the outbox's idempotency key,
+so Stripe hands back the same session instead of creating another one.
+``audit_checkout_queries`` checks that the number of writes stays fixed.
+``asend_checkout_session`` is the non-blocking variant used by the async views.
+"""
+from asgiref.sync import sync_to_async
+from stripe._error import APIConnectionError, StripeError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from . import stripe_gateway
+from .models import CheckoutOutbox, Order, OrderItem, order_items_summary
+from .replicas import pin_to_primary
+
+
+def create_pending_order(user, total_amount, idempotency_key, fingerprint, order_items_data,
+                         line_items, success_url, cancel_url):
+    """Insert a pending order, its items and its outbox row in one transaction."""
+    with transaction.atomic():
+        order = Order.objects.create(
+            user=user,
+            status='pending',
+            total_amount=total_amount,
+            idempotency_key=idempotency_key,
+            cart_fingerprint=fingerprint,
+            item_count=len(order_items_data),
+            items_summary=order_items_summary([
+                (item_data['product'].name, item_data['quantity'], item_data['price'])
+                for item_data in order_items_data
+            ]),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item_data['product'],
+                quantity=item_data['quantity'],
+                price=item_data['price'],
+            )
+            for item_data in order_items_data
+        ])
+        outbox = CheckoutOutbox.objects.create(
+            order=order,
+            payload={
+                'payment_method_types': ['card'],
+                'line_items': line_items,
+                'mode': 'payment',
+                'success_url': success_url,
+                'cancel_url': cancel_url,
+                'metadata': {
+                    'order_id': str(order.id),
+                    'idempotency_key': idempotency_key,
+                },
+            },
+        )
+    pin_to_primary([order.user_id])
+    return order, outbox
+
+
+def send_checkout_session(outbox):
+    """Create the Stripe Checkout Session for an outbox row and record the result.
+
+    Must be called outside any transaction. Returns the session id. Stripe
+    errors are re-raised after being recorded: connection errors leave the row
+    pending for a retry, any other error fails the order.
+    """
+    try:
+        checkout_session = stripe_gateway.create_checkout_session(
+            idempotency_key=outbox.stripe_idempotency_key,
+            **outbox.payload,
+        )
+    except APIConnectionError as e:
+        # Stripe may or may not have created the session (or the breaker is open);
+        # retry later with the same key
+        record_attempt(outbox, e)
+        raise
+    except StripeError as e:
+        record_failure(outbox, e)
+        raise
+    record_session(outbox, checkout_session.id)
+    return checkout_session.id
+
+
+async def asend_checkout_session(outbox):
+    """Async variant of send_checkout_session."""
+    try:
+        checkout_session = await stripe_gateway.acreate_checkout_session(
+            idempotency_key=outbox.stripe_idempotency_key,
+            **outbox.payload,
+        )
+    except APIConnectionError as e:
+        await sync_to_async(record_attempt)(outbox, e)
+        raise
+    except StripeError as e:
+        await sync_to_async(record_failure)(outbox, e)
+        raise
+    await sync_to_async(record_session)(outbox, checkout_session.id)
+    return checkout_session.id
+
+
+def record_session(outbox, session_id):
+    """Store the session id on the order and close the outbox row."""
+    with transaction.atomic():
+        Order.objects.filter(id=outbox.order_id, stripe_session_id__isnull=True).update(
+            stripe_session_id=session_id,
+            updated_at=Now(),
+        )
+        CheckoutOutbox.objects.filter(id=outbox.id).update(
+            status='sent',
+            attempts=F('attempts') + 1,
+            last_error='',
+            updated_at=Now(),
+        )
+
+
+def record_failure(outbox, error, count_attempt=True):
+    """Fail the order and its outbox row after Stripe refused to create the session.
+
+    Pass count_attempt=False when the attempt was already counted (by record_attempt).
+    """
+    with transaction.atomic():
+        Order.objects.filter(id=outbox.order_id, status='pending').update(
+            status='failed',
+            updated_at=Now(),
+        )
+        CheckoutOutbox.objects.filter(id=outbox.id).update(
+            status='failed',
+            attempts=F('attempts') + 1 if count_attempt else F('attempts'),
+            last_error=str(error),
+            updated_at=Now(),
+        )
+
+
+def record_attempt(outbox, error):
+    """Note an inconclusive attempt, leaving the row pending for a retry."""
+    CheckoutOutbox.objects.filter(id=outbox.id).update(
+        attempts=F('attempts') + 1,
+        last_error=str(error),
+        updated_at=Now(),
+    )
@@ -0,0 +1,46 @@
+"""Cancelling pending orders whose checkout was abandoned.
+
+A Checkout Session expires 24 hours after creation at most, so an order still
+pending well past that was never paid. The age is measured from when the
+session was created (the outbox row was sent), which can be later than the
+order itself when sweep_checkout_outbox retried it. ``expire_batch`` cancels
+the oldest such orders in small transactions; rows locked by a checkout or a
+webhook in flight are skipped (SKIP LOCKED) and picked up by a later batch.
+
+A payment that still turns up for an expired order (a late or lost webhook) is
+applied by the webhook worker and the reconcilers, which accept recently
+cancelled orders as well as pending ones (see store.reconciliation).
+"""
+from django.db import transaction
+from django.db.models.functions import Now
+
+from .models import CheckoutOutbox, Order
+
+
+def expirable_orders(cutoff):
+    """Pending orders created before cutoff whose Checkout Session (if any) was also created before it."""
+    return Order.objects.filter(status='pending', created_at__lt=cutoff).exclude(
+        outbox__status='sent', outbox__updated_at__gte=cutoff,
+    )
+
+
+def expire_candidates(cutoff, batch_size):
+    """Ids of the oldest batch_size expirable orders, locked (SKIP LOCKED) when run in a transaction."""
+    return (
+        expirable_orders(cutoff).select_for_update(skip_locked=True, of=('self',))
+        .order_by('created_at')
+        .values_list('id', flat=True)[:batch_size]
+    )
+
+
+def expire_batch(cutoff, batch_size=500):
+    """Cancel up to batch_size expirable orders (oldest first). Returns their ids."""
+    with transaction.atomic():
+        order_ids = list(expire_candidates(cutoff, batch_size))
+        if order_ids:
+            Order.objects.filter(id__in=order_ids, status='pending').update(status='cancelled', updated_at=Now())
+            # Stop sweep_checkout_outbox from creating a session for a cancelled order
+            CheckoutOutbox.objects.filter(order_id__in=order_ids, status='pending').update(
+                status='failed', last_error='order expired', updated_at=Now(),
+            )
+    return order_ids
@@ -0,0 +1,353 @@
+"""A local stand-in for the parts of the Stripe API the store uses.
+
+Serves Checkout Session create / retrieve / list, and Product / Price
+create / retrieve / update, with Stripe's request and response formats, so the SDK, ``stripe_async`` and the whole payment flow run
+against it unchanged when ``STRIPE_API_BASE`` points here. Visiting a session's
+``url`` (the "hosted checkout page") pays the session, delivers a signed
+``checkout.session.completed`` webhook and redirects to the success URL.
+``POST /v1/checkout/sessions/<id>/complete`` does the same without the redirect.
+
+Latency, 500 errors and 429 rate limiting can be injected for load tests.
+Nothing here imports Django, so benchmarks can start the server in-process;
+``manage.py run_fake_stripe`` runs it from the project settings.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+import urllib.request
+import uuid
+
+
+def parse_latency(spec):
+    """Return a function drawing latencies in seconds from a spec.
+
+    Specs: ``0.2`` (fixed), ``uniform:0.1,0.5``, ``normal:0.2,0.05``,
+    ``lognormal:0.2,0.5`` (median, sigma) and ``exp:0.2`` (mean).
+    """
+    name, _, args = spec.partition(':')
+    if not args:
+        fixed = float(name)
+        return lambda: fixed
+    values = [float(value) for value in args.split(',')]
+    if name == 'uniform':
+        return lambda: random.uniform(*values)
+    if name == 'normal':
+        return lambda: max(0.0, random.gauss(*values))
+    if name == 'lognormal':
+        median, sigma = values
+        mu = math.log(median)
+        return lambda: random.lognormvariate(mu, sigma)
+    if name == 'exp':
+        return lambda: random.expovariate(1 / values[0])
+    raise ValueError(f'Unknown latency distribution: {spec!r}')
+
+
+def decode_form(body):
+    """Decode Stripe's form encoding (``line_items[0][price_data][currency]=usd``) into nested data."""
+    root = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r'[^\[\]]+', key)
+        node = root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+
+    def listify(node):
+        if not isinstance(node, dict):
+            return node
+        if node and all(key.isdigit() for key in node):
+            return [listify(node[key]) for key in sorted(node, key=int)]
+        return {key: listify(value) for key, value in node.items()}
+
+    return listify(root)
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Return a Stripe-Signature header value for payload (str)."""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+class FakeStripe:
+    """In-memory Checkout Sessions plus the failure injection settings."""
+
+    def __init__(self, latency='0', error_rate=0.0, rate_limit=0.0, rate_limit_ratio=0.0,
+                 webhook_url='', webhook_secret=''):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_limit_ratio = rate_limit_ratio
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.base_url = ''
+        self.sessions = {}
+        self.objects = {}  # products and prices by id
+        self.idempotent_responses = {}
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'webhooks': 0, 'webhook_failures': 0}
+        self._lock = threading.Lock()
+        self._window = (0, 0)  # (second, requests served in that second)
+        self._sequence = itertools.count(1)
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def should_rate_limit(self):
+        if self.rate_limit_ratio and random.random() < self.rate_limit_ratio:
+            return True
+        if not self.rate_limit:
+            return False
+        second = int(time.monotonic())
+        with self._lock:
+            window_second, served = self._window
+            if window_second != second:
+                served = 0
+            self._window = (second, served + 1)
+            return served >= self.rate_limit
+
+    def create_session(self, params, idempotency_key=None):
+        with self._lock:
+            if idempotency_key and idempotency_key in self.idempotent_responses:
+                return self.idempotent_responses[idempotency_key]
+            session_id = f'cs_test_{uuid.uuid4().hex}'
+            line_items = params.get('line_items') or []
+            for item in line_items:
+                if 'price' in item and item['price'] in self.objects:
+                    price = self.objects[item['price']]
+                    item['price_data'] = {'currency': price['currency'], 'unit_amount': price['unit_amount']}
+            amount_total = sum(
+                int(item.get('price_data', {}).get('unit_amount', 0)) * int(item.get('quantity', 1))
+                for item in line_items
+            )
+            session = {
+                'id': session_id,
+                'object': 'checkout.session',
+                'amount_total': amount_total,
+                'created': int(time.time()),
+                'currency': (line_items[0].get('price_data', {}).get('currency') if line_items else None) or 'usd',
+                'livemode': False,
+                'metadata': params.get('metadata') or {},
+                'mode': params.get('mode', 'payment'),
+                'payment_intent': None,
+                'payment_status': 'unpaid',
+                'status': 'open',
+                'success_url': params.get('success_url'),
+                'cancel_url': params.get('cancel_url'),
+                'url': f'{self.base_url}/pay/{session_id}',
+                '_sequence': next(self._sequence),
+            }
+            self.sessions[session_id] = session
+            if idempotency_key:
+                self.idempotent_responses[idempotency_key] = session
+            return session
+
+    def create_object(self, kind, params, idempotency_key=None):
+        """Create a product (with its default_price_data, if given) or a price."""
+        with self._lock:
+            if idempotency_key and (kind, idempotency_key) in self.idempotent_responses:
+                return self.idempotent_responses[(kind, idempotency_key)]
+            prefix = 'prod' if kind == 'product' else 'price'
+            obj = {'id': f'{prefix}_test_{uuid.uuid4().hex[:14]}', 'object': kind, 'active': True,
+                   'created': int(time.time()), 'livemode': False, 'metadata': {}}
+            default_price_data = params.pop('default_price_data', None)
+            obj.update(params)
+            if kind == 'price':
+                obj['unit_amount'] = int(obj.get('unit_amount', 0))
+            self.objects[obj['id']] = obj
+            if idempotency_key:
+                self.idempotent_responses[(kind, idempotency_key)] = obj
+        if default_price_data:
+            price = self.create_object('price', dict(default_price_data, product=obj['id']))
+            obj['default_price'] = price['id']
+        return obj
+
+    def update_object(self, object_id, params):
+        with self._lock:
+            obj = self.objects.get(object_id)
+            if obj is not None:
+                if 'active' in params:
+                    params['active'] = params['active'] == 'true'
+                obj.update(params)
+            return obj
+
+    def complete_session(self, session_id):
+        """Pay a session and deliver its webhook. Returns the session, or None if unknown."""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            if session['status'] == 'complete':
+                return session
+            session.update(
+                status='complete',
+                payment_status='paid',
+                payment_intent=f'pi_test_{uuid.uuid4().hex[:24]}',
+            )
+        if self.webhook_url:
+            threading.Thread(target=self.send_webhook, args=(session,), daemon=True).start()
+        return session
+
+    def send_webhook(self, session):
+        event = {
+            'id': f'evt_test_{uuid.uuid4().hex}',
+            'object': 'event',
+            'api_version': '2023-10-16',
+            'created': int(time.time()),
+            'livemode': False,
+            'type': 'checkout.session.completed',
+            'data': {'object': public(session)},
+        }
+        payload = json.dumps(event)
+        request = urllib.request.Request(
+            self.webhook_url,
+            data=payload.encode(),
+            headers={
+                'Content-Type': 'application/json',
+                'Stripe-Signature': sign_payload(payload, self.webhook_secret),
+            },
+        )
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except Exception:
+            self.count('webhook_failures')
+        else:
+            self.count('webhooks')
+
+    def list_sessions(self, params):
+        limit = min(int(params.get('limit', 10)), 100)
+        created = params.get('created') or {}
+        with self._lock:
+            # Newest first, like Stripe
+            sessions = sorted(self.sessions.values(), key=lambda s: s['_sequence'], reverse=True)
+        if params.get('status'):
+            sessions = [s for s in sessions if s['status'] == params['status']]
+        if 'gte' in created:
+            sessions = [s for s in sessions if s['created'] >= int(created['gte'])]
+        if 'lte' in created:
+            sessions = [s for s in sessions if s['created'] <= int(created['lte'])]
+        if params.get('starting_after'):
+            ids = [s['id'] for s in sessions]
+            start = ids.index(params['starting_after']) + 1 if params['starting_after'] in ids else len(ids)
+            sessions = sessions[start:]
+        return {
+            'object': 'list',
+            'url': '/v1/checkout/sessions',
+            'has_more': len(sessions) > limit,
+            'data': [public(s) for s in sessions[:limit]],
+        }
+
+
+def public(session):
+    return {key: value for key, value in session.items() if not key.startswith('_')}
+
+
+def _error(status, error_type, message, code=None):
+    error = {'type': error_type, 'message': message}
+    if code:
+        error['code'] = code
+    return status, {'error': error}
+
+
+def make_handler(fake):
+    class FakeStripeHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like api.stripe.com
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self, method):
+            fake.count('requests')
+            url = urlsplit(self.path)
+            body = ''
+            if method == 'POST':
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+
+            if url.path.startswith('/pay/'):
+                return self._pay(url.path.rsplit('/', 1)[-1])
+
+            time.sleep(fake.latency())
+            if fake.should_rate_limit():
+                fake.count('rate_limited')
+                return self._send(*_error(429, 'invalid_request_error', 'Too many requests', 'rate_limit'))
+            if fake.error_rate and random.random() < fake.error_rate:
+                fake.count('errors')
+                return self._send(*_error(500, 'api_error', 'Injected error from the Stripe stand-in'))
+
+            params = decode_form(body if method == 'POST' else url.query)
+            path = url.path.rstrip('/')
+            if path == '/v1/checkout/sessions':
+                if method == 'POST':
+                    session = fake.create_session(params, self.headers.get('Idempotency-Key'))
+                    return self._send(200, public(session))
+                return self._send(200, fake.list_sessions(params))
+            match = re.fullmatch(r'/v1/(product|price)s(?:/([^/]+))?', path)
+            if match:
+                kind, object_id = match.groups()
+                if object_id is None and method == 'POST':
+                    return self._send(200, fake.create_object(kind, params, self.headers.get('Idempotency-Key')))
+                obj = fake.update_object(object_id, params) if method == 'POST' else fake.objects.get(object_id)
+                if obj is None:
+                    return self._send(*_error(
+                        404, 'invalid_request_error', f"No such {kind}: '{object_id}'", 'resource_missing'
+                    ))
+                return self._send(200, obj)
+            match = re.fullmatch(r'/v1/checkout/sessions/([^/]+)(/complete)?', path)
+            if match:
+                session_id, complete = match.groups()
+                if complete and method == 'POST':
+                    session = fake.complete_session(session_id)
+                else:
+                    session = fake.sessions.get(session_id)
+                if session is None:
+                    return self._send(*_error(
+                        404, 'invalid_request_error', f"No such checkout.session: '{session_id}'", 'resource_missing'
+                    ))
+                return self._send(200, public(session))
+            return self._send(*_error(404, 'invalid_request_error', f'Unrecognized request URL ({method}: {path})'))
+
+        def _pay(self, session_id):
+            session = fake.complete_session(session_id)
+            if session is None:
+                return self._send(404, {'error': {'message': 'Unknown session'}})
+            location = re.sub(r'\{CHECKOUT_SESSION_ID\}|%7BCHECKOUT_SESSION_ID%7D', session_id,
+                              session['success_url'] or '/')
+            self.send_response(303)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+        def log_message(self, *args):
+            pass
+
+    return FakeStripeHandler
+
+
+def start_server(fake, host='127.0.0.1', port=12111):
+    """Serve fake on a background thread. Returns the server (call .shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    fake.base_url = f'http://{host}:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,44 @@
+from datetime import timedelta
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.archive import SETTLED_STATUSES, archive_orders
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = ('Move settled orders older than --days from the Order/OrderItem tables into ArchivedOrder, '
+            'optionally exporting them as monthly gzip JSONL files')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Archive orders created more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders moved per transaction')
+        parser.add_argument('--export-dir', help='Also append archived orders to orders-YYYY-MM.jsonl.gz files here')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = Order.objects.filter(status__in=SETTLED_STATUSES, created_at__lt=cutoff).count()
+            self.stdout.write(f'{count} settled order(s) created before {cutoff:%Y-%m-%d} would be archived.')
+            return
+        if options['export_dir']:
+            if not os.path.isdir(options['export_dir']):
+                raise CommandError(f'Export directory {options["export_dir"]} does not exist')
+
+        def progress(totals):
+            self.stdout.write(f'  archived {totals["archived"]} order(s) in {totals["batches"]} batch(es)')
+
+        totals = archive_orders(
+            cutoff,
+            batch_size=options['batch_size'],
+            export_dir=options['export_dir'],
+            progress=progress,
+        )
+        for path in totals['files']:
+            self.stdout.write(f'  exported to {path}')
+        self.stdout.write(self.style.SUCCESS(
+            f'\nArchived {totals["archived"]} order(s) created before {cutoff:%Y-%m-%d}.'
+        ))
@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from store.checkout import create_pending_order, record_session
+from store.models import Product
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Check that the checkout write path issues the same number of queries for every cart size'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1, 10, 30],
+            help='Cart sizes to compare (capped at the number of products in the catalog)',
+        )
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.all()[:max(options['sizes'])])
+        if not products:
+            raise CommandError('No products found. Run seed_products first.')
+
+        counts = {}
+        for size in sorted(set(min(size, len(products)) for size in options['sizes'])):
+            counts[size] = self.count_write_queries(products[:size])
+            self.stdout.write(f'  {size:>4} line(s): {counts[size]} queries')
+
+        if len(set(counts.values())) > 1:
+            raise CommandError(f'Checkout write queries grow with cart size: {counts}')
+        self.stdout.write(self.style.SUCCESS('Checkout write path uses a constant number of queries.'))
+
+    def count_write_queries(self, products):
+        """Run both checkout transactions for a cart of the given products and roll them back."""
+        order_items_data = [
+            {'product': product, 'quantity': 1, 'price': product.price}
+            for product in products
+        ]
+        total_amount = sum((product.price for product in products), Decimal('0.00'))
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    order, outbox = create_pending_order(
+                        user=None,
+                        total_amount=total_amount,
+                        idempotency_key=f'audit-{len(products)}',
+                        fingerprint='',
+                        order_items_data=order_items_data,
+                        line_items=[],
+                        success_url='',
+                        cancel_url='',
+                    )
+                    record_session(outbox, f'cs_audit_{len(products)}')
+                raise _Rollback
+        except _Rollback:
+            pass
+        return len(queries.captured_queries)
@@ -0,0 +1,161 @@
+from contextlib import contextmanager
+from datetime import timedelta
+import random
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from store.archive import archive_candidates
+from store.expiry import expire_candidates
+from store.models import Order
+from store.order_history import paid_orders_after
+from store.reconciliation import due_orders, reconcilable, reconcile_chunk, session_list_orders
+from store.sales_rollup import changed_order_days, paid_orders_of_day
+
+# Status mix of the synthetic orders: mostly paid, a thin slice pending
+STATUS_WEIGHTS = {'paid': 85, 'pending': 5, 'failed': 7, 'cancelled': 3}
+
+# A whole-table read in each backend's EXPLAIN output. On SQLite "SCAN" also
+# covers walking a full index, which is only acceptable for the partial ones.
+_PARTIAL_INDEXES = '|'.join(index.name for index in Order._meta.indexes if index.condition is not None)
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on store_order\b'),
+    'sqlite': re.compile(rf'\bSCAN store_order\b(?! USING (?:COVERING )?INDEX (?:{_PARTIAL_INDEXES})\b)'),
+}
+
+
+@contextmanager
+def _explicit_timestamps():
+    """Let bulk_create write the synthetic created_at/updated_at values instead of now().
+
+    With updated_at left at now() every row would match the "changed recently"
+    queries, and PostgreSQL would rightly prefer a sequential scan for them.
+    """
+    created_at = Order._meta.get_field('created_at')
+    updated_at = Order._meta.get_field('updated_at')
+    created_at.auto_now_add = False
+    updated_at.auto_now = False
+    try:
+        yield
+    finally:
+        created_at.auto_now_add = True
+        updated_at.auto_now = True
+
+
+def order_queries(user, now):
+    """(name, queryset) for every Order filter the app issues, with realistic arguments.
+
+    Where the app builds a query in a function, that function is called here, so
+    the audit follows any change to it. The views' inline filters are copied.
+    """
+    cutoff = now - timedelta(days=30)
+    return [
+        ('home: paid history', Order.objects.filter(user=user, status='paid').order_by('-created_at')[:10]),
+        ('home: pending orders to reconcile', Order.objects.filter(
+            user=user, status='pending', stripe_session_id__isnull=False,
+        ).values_list('id', flat=True)[:5]),
+        ('api_orders: next page', paid_orders_after(Order, user, (cutoff, 1000))[:21]),
+        ('checkout: idempotency key', Order.objects.filter(idempotency_key='audit-1')[:1]),
+        ('checkout: recent duplicate cart', Order.objects.filter(
+            cart_fingerprint='0' * 64, created_at__gte=now - timedelta(seconds=5),
+            status='pending', stripe_session_id__isnull=False,
+        )[:1]),
+        ('success: order by session', Order.objects.filter(stripe_session_id='cs_audit_1')[:1]),
+        ('update_paid_orders', Order.objects.filter(reconcilable(now))),
+        ('update_paid_orders --concurrent', reconcile_chunk(1000, 500, now)),
+        ('update_paid_orders --from-list', session_list_orders(now - timedelta(hours=48), now)),
+        ('reconcile_orders: claim batch', due_orders(now).select_for_update(skip_locked=True)[:50]),
+        ('metrics: pending by age', Order.objects.filter(status='pending', created_at__lte=now)),
+        ('expire_pending_orders: batch', expire_candidates(now - timedelta(hours=25), 500)),
+        ('rollup_sales: changed orders', changed_order_days(Order, now - timedelta(minutes=5), now)),
+        ('rollup_sales: paid orders of a day', paid_orders_of_day(cutoff.date())),
+        ('archive_orders: oldest settled', archive_candidates(now - timedelta(days=365), 1000)),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN every Order access pattern against a large synthetic dataset in a throwaway '
+            'test database and fail if any of them scans the whole orders table')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200000, help='Synthetic orders to create')
+        parser.add_argument('--users', type=int, default=2000, help='Users the orders are spread over')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Reuse the test database (and its synthetic data) between runs')
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Query plans on {connection.vendor} are not supported')
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                f'Checking {connection.vendor} plans. Production runs PostgreSQL, whose planner can choose '
+                'differently: run this against it as well before relying on the result.'
+            ))
+
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            user = self.prepare_data(options['orders'], options['users'])
+            failures = []
+            for name, queryset in order_queries(user, timezone.now()):
+                # The SKIP LOCKED queries may only run inside a transaction
+                with transaction.atomic():
+                    plan = queryset.explain()
+                if pattern.search(plan):
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f'  SEQ SCAN  {name}'))
+                else:
+                    self.stdout.write(f'  ok        {name}')
+                if options['verbosity'] > 1 or pattern.search(plan):
+                    self.stdout.write('            ' + plan.replace('\n', '\n            '))
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+        if failures:
+            raise CommandError(f'Full table scans in: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS(f'Every Order query uses an index on {connection.vendor}.'))
+
+    def prepare_data(self, order_count, user_count):
+        """Create the synthetic users and orders (once, with --keepdb). Returns a user to query for."""
+        user = User.objects.filter(username='audit-user-0').first()
+        if user is not None:
+            self.stdout.write(f'Reusing {Order.objects.count()} orders.')
+            return user
+
+        self.stdout.write(f'Creating {order_count} orders for {user_count} users...')
+        users = User.objects.bulk_create([
+            User(username=f'audit-user-{n}', password='!') for n in range(user_count)
+        ])
+        rng = random.Random(0)
+        statuses = rng.choices(list(STATUS_WEIGHTS), weights=STATUS_WEIGHTS.values(), k=order_count)
+        now = timezone.now()
+        batch = []
+        with _explicit_timestamps():
+            for n, status in enumerate(statuses):
+                created_at = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+                batch.append(Order(
+                    user=rng.choice(users),
+                    status=status,
+                    total_amount=rng.randint(100, 100000) / 100,
+                    created_at=created_at,
+                    # Settled within minutes of checkout
+                    updated_at=created_at + timedelta(seconds=rng.randint(0, 600)),
+                    # Pending orders that never reached Stripe have no session
+                    stripe_session_id=None if status == 'pending' and n % 2 else f'cs_audit_{n}',
+                    idempotency_key=f'audit-{n}',
+                    cart_fingerprint=f'{rng.getrandbits(256):064x}',
+                    reconcile_requested_at=now if status == 'pending' and n % 50 == 0 else None,
+                ))
+                if len(batch) == 5000:
+                    Order.objects.bulk_create(batch)
+                    batch = []
+            Order.objects.bulk_create(batch)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return users[0]
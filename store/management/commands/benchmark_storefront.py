@@ -0,0 +1,130 @@
+import json
+import platform
+
+import django
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from store import benchmarking
+from store.fake_stripe import FakeStripe, start_server
+
+WEBHOOK_SECRET = 'whsec_benchmark'
+
+
+class Command(BaseCommand):
+    help = ('Load-test the storefront flows in a throwaway test database against the Stripe stand-in '
+            'and report latency percentiles, throughput and queries per request')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients per scenario')
+        parser.add_argument('--cart-sizes', default='1,5,20', help='Comma-separated checkout cart sizes')
+        parser.add_argument('--history', type=int, default=50,
+                            help='Paid orders owned by the authenticated user')
+        parser.add_argument('--stripe-latency', default='lognormal:0.05,0.5',
+                            help='Stripe stand-in latency (see run_fake_stripe --latency)')
+        parser.add_argument('--scenarios', help='Comma-separated scenario names to run (default: all)')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to PATH as JSON')
+        parser.add_argument('--compare', metavar='PATH', help='Fail if results regress against the baseline at PATH')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative latency/throughput regression (--compare)')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        cart_sizes = [int(size) for size in options['cart_sizes'].split(',')]
+        fake = FakeStripe(latency=options['stripe_latency'])
+        server = start_server(fake, port=0)
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        api_base = stripe.api_base
+        stripe.api_base = fake.base_url
+        try:
+            with override_settings(
+                STRIPE_API_BASE=fake.base_url,
+                STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                results = self.run_scenarios(fake, cart_sizes, options)
+        finally:
+            stripe.api_base = api_base
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            server.shutdown()
+
+        self.print_results(results)
+        report = {
+            'environment': {
+                'database': connection.vendor,
+                'settings': settings.SETTINGS_MODULE,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'stripe_latency': options['stripe_latency'],
+            },
+            'scenarios': results,
+        }
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {options["save_baseline"]}'))
+        if options['compare']:
+            self.compare(report, options)
+
+    def run_scenarios(self, fake, cart_sizes, options):
+        total = options['requests']
+        product_ids = benchmarking.prepare_catalog(max(cart_sizes + [3]))
+        user = benchmarking.prepare_user(options['history'], product_ids)
+        sessions = benchmarking.prepare_paid_sessions(fake, total, product_ids)
+
+        scenarios = [
+            benchmarking.Scenario('home_anonymous', lambda client, i: client.get('/'),
+                                  benchmarking.anonymous_client),
+            benchmarking.Scenario('home_authenticated', lambda client, i: client.get('/'),
+                                  benchmarking.authenticated_client_factory(user)),
+        ]
+        scenarios += [
+            benchmarking.Scenario(f'checkout_cart_{size}', benchmarking.checkout_request(product_ids, size),
+                                  benchmarking.anonymous_client)
+            for size in cart_sizes
+        ]
+        scenarios += [
+            benchmarking.Scenario('success_redirect', benchmarking.success_request(sessions),
+                                  benchmarking.anonymous_client),
+            benchmarking.Scenario('webhook_burst', benchmarking.webhook_request(sessions, WEBHOOK_SECRET),
+                                  benchmarking.anonymous_client),
+        ]
+        if options['scenarios']:
+            wanted = set(options['scenarios'].split(','))
+            scenarios = [scenario for scenario in scenarios if scenario.name in wanted]
+
+        results = {}
+        for scenario in scenarios:
+            self.stdout.write(f'Running {scenario.name}...')
+            results[scenario.name] = benchmarking.run_scenario(scenario, total, options['concurrency'])
+        return results
+
+    def print_results(self, results):
+        header = f'{"scenario":<20} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8} {"queries":>8} {"errors":>7}'
+        self.stdout.write('\n' + header)
+        self.stdout.write('-' * len(header))
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<20} {result["p50_ms"]:>9} {result["p95_ms"]:>9} {result["p99_ms"]:>9} '
+                f'{result["throughput_rps"]:>8} {result["queries_per_request"]:>8} {result["errors"]:>7}'
+            )
+
+    def compare(self, report, options):
+        with open(options['compare']) as f:
+            baseline = json.load(f)
+        if baseline.get('environment', {}).get('database') != report['environment']['database']:
+            self.stdout.write(self.style.WARNING(
+                f'Baseline was recorded on {baseline.get("environment", {}).get("database")}, '
+                f'this run uses {report["environment"]["database"]}; latency comparisons may not be meaningful'
+            ))
+        regressions = benchmarking.compare(report['scenarios'], baseline, options['tolerance'])
+        if regressions:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
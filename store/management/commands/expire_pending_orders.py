@@ -0,0 +1,50 @@
+from datetime import timedelta
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.expiry import expirable_orders, expire_batch
+
+
+class Command(BaseCommand):
+    help = 'Cancel pending orders whose Stripe Checkout Session has expired, in rate-limited batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=25,
+                            help='Cancel orders whose Checkout Session is older than this (sessions expire after 24h)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders cancelled per transaction')
+        parser.add_argument('--rate', type=float, default=1000,
+                            help='Max orders cancelled per second, to stay out of the way of checkout traffic')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would be cancelled')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        if options['dry_run']:
+            count = expirable_orders(cutoff).count()
+            self.stdout.write(f'{count} pending order(s) created before {cutoff:%Y-%m-%d %H:%M} would be cancelled.')
+            return
+
+        swept = batches = 0
+        batch_times = []
+        started = time.monotonic()
+        while True:
+            batch_started = time.monotonic()
+            order_ids = expire_batch(cutoff, options['batch_size'])
+            elapsed = time.monotonic() - batch_started
+            if not order_ids:
+                break
+            swept += len(order_ids)
+            batches += 1
+            batch_times.append(elapsed)
+            self.stdout.write(f'  batch {batches}: cancelled {len(order_ids)} order(s) in {elapsed * 1000:.1f}ms')
+            # Spread the batches out so the sweep never exceeds --rate orders per second
+            time.sleep(max(len(order_ids) / options['rate'] - elapsed, 0))
+
+        if not swept:
+            self.stdout.write(self.style.SUCCESS('No expired pending orders found.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'\nCancelled {swept} order(s) in {batches} batch(es) over {time.monotonic() - started:.1f}s '
+            f'(batch avg {sum(batch_times) / batches * 1000:.1f}ms, max {max(batch_times) * 1000:.1f}ms).'
+        ))
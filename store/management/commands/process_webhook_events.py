@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.webhooks import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply recorded Stripe webhook events (several workers can run in parallel)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Events applied per batch')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Stop retrying an event after this many failures')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when no events are waiting')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as no events are waiting')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, failed = process_batch(options['batch_size'], options['max_attempts'])
+            if processed or failed:
+                self.stdout.write(f'Processed {processed} event(s), {failed} failed')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
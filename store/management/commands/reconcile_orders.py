@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.reconciliation import check_done, claim_batch, reconcile_order, retry_later
+
+
+class Command(BaseCommand):
+    help = 'Drain the pending-order reconciliation queue filled by the home page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Orders claimed per batch')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as no queued order is due')
+
+    def handle(self, *args, **options):
+        while True:
+            orders = claim_batch(options['batch_size'])
+            if not orders:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            for order in orders:
+                try:
+                    updated = reconcile_order(order)
+                except Exception as e:
+                    delay = retry_later(order)
+                    self.stdout.write(self.style.ERROR(
+                        f'Error checking order {order.id}: {e} (retrying in {delay.total_seconds():.0f}s)'
+                    ))
+                    continue
+                check_done(order)
+                if updated:
+                    self.stdout.write(self.style.SUCCESS(f'Updated order {order.id} to paid'))
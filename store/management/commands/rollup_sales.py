@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from store.sales_rollup import rollup_sales
+
+
+class Command(BaseCommand):
+    help = 'Update the daily sales rollup tables from orders changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lag', type=int, default=60,
+                            help='Seconds behind now() to stop, so in-flight transactions are not missed')
+        parser.add_argument('--rebuild', action='store_true', help='Ignore the watermark and recompute every day')
+
+    def handle(self, *args, **options):
+        def progress(day):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  recomputed {day}')
+
+        totals = rollup_sales(lag=options['lag'], rebuild=options['rebuild'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {totals["days"]} day(s); rollups are current up to {totals["watermark"]:%Y-%m-%d %H:%M:%S}.'
+        ))
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.fake_stripe import FakeStripe, start_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local Stripe stand-in (point STRIPE_API_BASE at it) for offline load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency', default='0.2',
+                            help='Seconds per API call: 0.2, uniform:0.1,0.5, normal:0.2,0.05, '
+                                 'lognormal:0.2,0.5 (median, sigma) or exp:0.2')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered with a 500')
+        parser.add_argument('--rate-limit', type=float, default=0.0,
+                            help='Requests per second before answering 429 (0 = unlimited)')
+        parser.add_argument('--rate-limit-ratio', type=float, default=0.0,
+                            help='Fraction of calls answered with a 429 regardless of load')
+        parser.add_argument('--webhook-url', default='http://127.0.0.1:8000/webhook/',
+                            help="Where to deliver checkout.session.completed ('' to disable)")
+        parser.add_argument('--stats-interval', type=float, default=10.0, help='Seconds between stats lines')
+
+    def handle(self, *args, **options):
+        fake = FakeStripe(
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            rate_limit=options['rate_limit'],
+            rate_limit_ratio=options['rate_limit_ratio'],
+            webhook_url=options['webhook_url'],
+            webhook_secret=settings.STRIPE_WEBHOOK_SECRET,
+        )
+        server = start_server(fake, options['host'], options['port'])
+        self.stdout.write(self.style.SUCCESS(f'Stripe stand-in listening on {fake.base_url}'))
+        self.stdout.write(f'Start the app with STRIPE_API_BASE={fake.base_url}')
+        if options['webhook_url'] and not settings.STRIPE_WEBHOOK_SECRET:
+            self.stdout.write(self.style.WARNING(
+                'STRIPE_WEBHOOK_SECRET is empty; the app ignores webhooks until it is set'
+            ))
+
+        try:
+            while True:
+                time.sleep(options['stats_interval'])
+                self.stdout.write(
+                    ', '.join(f'{name} {value}' for name, value in fake.stats.items())
+                    + f', sessions {len(fake.sessions)}'
+                )
+        except KeyboardInterrupt:
+            server.shutdown()
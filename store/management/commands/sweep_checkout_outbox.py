@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+from stripe._error import APIConnectionError, StripeError
+
+from store.checkout import record_attempt, record_failure, send_checkout_session
+from store.models import CheckoutOutbox
+
+
+class Command(BaseCommand):
+    help = 'Finish or fail checkouts whose Stripe session was never recorded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=60, help='Only touch outbox rows older than this many seconds')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Fail the order if this many attempts and one final retry do not get a session')
+        parser.add_argument('--batch-size', type=int, default=100, help='Outbox rows handled per run')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=options['grace'])
+
+        # Claim stale rows by touching updated_at, so a concurrent sweeper skips them
+        with transaction.atomic():
+            stale = list(
+                CheckoutOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', updated_at__lt=cutoff)
+                .order_by('created_at')[:options['batch_size']]
+            )
+            CheckoutOutbox.objects.filter(id__in=[outbox.id for outbox in stale]).update(updated_at=Now())
+
+        if not stale:
+            self.stdout.write(self.style.SUCCESS('No stuck checkouts found.'))
+            return
+
+        sent_count = failed_count = 0
+        for outbox in stale:
+            # Earlier connection errors may have created the session on Stripe's side, so
+            # the final attempt still asks Stripe: the same idempotency key returns it
+            final = outbox.attempts >= options['max_attempts']
+            try:
+                session_id = send_checkout_session(outbox)
+            except APIConnectionError as e:
+                if final:
+                    # send_checkout_session already counted this attempt (record_attempt)
+                    record_failure(outbox, f'gave up after {outbox.attempts + 1} attempt(s): {e}',
+                                   count_attempt=False)
+                    self.stdout.write(self.style.ERROR(
+                        f'Order {outbox.order_id} failed after {outbox.attempts + 1} attempt(s)'
+                    ))
+                    failed_count += 1
+                else:
+                    self.stdout.write(self.style.WARNING(f'Order {outbox.order_id}: {e}'))
+            except StripeError as e:
+                # Stripe refused the session; send_checkout_session already failed the order
+                self.stdout.write(self.style.ERROR(f'Order {outbox.order_id} failed: {e}'))
+                failed_count += 1
+            except Exception as e:
+                # Anything else (a database error, a malformed payload) only skips this row
+                self.stdout.write(self.style.ERROR(f'Order {outbox.order_id}: {e!r}'))
+                try:
+                    if final:
+                        record_failure(outbox, f'gave up after {outbox.attempts + 1} attempt(s): {e!r}')
+                        failed_count += 1
+                    else:
+                        record_attempt(outbox, repr(e))
+                except Exception as record_error:
+                    self.stdout.write(self.style.ERROR(f'  could not record the attempt: {record_error!r}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Order {outbox.order_id} -> session {session_id}'))
+                sent_count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'\nRecovered {sent_count} checkout(s), failed {failed_count}.'))
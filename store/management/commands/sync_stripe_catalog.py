@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from store.catalog_sync import sync_catalog
+
+
+class Command(BaseCommand):
+    help = 'Create or update Stripe Products and Prices for products that changed since the last sync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent Stripe requests')
+        parser.add_argument('--rate', type=float, default=20, help='Max Stripe requests per second')
+        parser.add_argument('--force', action='store_true', help='Re-sync every product, changed or not')
+
+    def handle(self, *args, **options):
+        def progress(product, action, error):
+            if error is not None:
+                self.stdout.write(self.style.ERROR(f'Error syncing product {product.id} ({product.name}): {error}'))
+            else:
+                self.stdout.write(f'  {action} product {product.id} ({product.name}) -> {product.stripe_price_id}')
+
+        totals = sync_catalog(
+            workers=options['workers'],
+            rate=options['rate'],
+            force=options['force'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'\nChecked {totals["checked"]} product(s): {totals["created"]} created, '
+            f'{totals["repriced"]} repriced, {totals["updated"]} updated, {totals["errors"]} error(s).'
+        ))
@@ -1,22 +1,49 @@
-from django.core.management.base import BaseCommand
-import stripe
-from django.conf import settings
-from store.models import Order
+from datetime import timedelta
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Now
+from django.utils import timezone
+from store.models import Order
+from store.reconciliation import (
+    PAYABLE_STATUSES, mark_paid, reconcilable, reconcile_from_session_list, reconcile_pending_orders,
+)
+from store.replicas import pin_to_primary
+from store.session_cache import get_session_status, stats
 
 
 class Command(BaseCommand):
     help = 'Update pending orders to paid status by checking Stripe sessions'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrent', action='store_true',
+                            help='Check orders in chunks through a rate-limited thread pool and write in bulk')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent Stripe requests (--concurrent)')
+        parser.add_argument('--rate', type=float, default=25,
+                            help='Max Stripe requests per second (--concurrent; Stripe allows 25/s in test mode, 100/s live)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Orders loaded per chunk (--concurrent)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the saved cursor and start from the first pending order (--concurrent)')
+        parser.add_argument('--from-list', action='store_true',
+                            help="Page through Stripe's session list instead of retrieving sessions one by one")
+        parser.add_argument('--hours', type=int, default=48,
+                            help='How far back to list sessions, in hours (--from-list)')
+
     def handle(self, *args, **options):
-        pending_orders = Order.objects.filter(status='pending')
+        if options['concurrent'] and options['from_list']:
+            raise CommandError('Use either --concurrent or --from-list, not both')
+        if options['concurrent']:
+            return self.handle_concurrent(options)
+        if options['from_list']:
+            return self.handle_from_list(options)
+
+        # Pending orders, and recently expired ones in case their payment's webhook was lost
+        pending_orders = Order.objects.filter(reconcilable())
         
         if not pending_orders.exists():
             self.stdout.write(self.style.SUCCESS('No pending orders found.'))
             return
         
-        self.stdout.write(f'Found {pending_orders.count()} pending order(s). Checking Stripe...')
+        self.stdout.write(f'Found {pending_orders.count()} order(s) to check. Checking Stripe...')
         
         updated_count = 0
         for order in pending_orders:
@@ -25,19 +52,53 @@ class Command(BaseCommand):
                 continue
             
             try:
-                session = stripe.checkout.Session.retrieve(order.stripe_session_id)
+                session = get_session_status(order.stripe_session_id)
                 
                 if session.payment_status == 'paid':
-                    order.status = 'paid'
-                    order.stripe_payment_intent_id = session.payment_intent
-                    order.save()
-                    self.stdout.write(self.style.SUCCESS(f'Updated order {order.id} to paid'))
-                    updated_count += 1
+                    if mark_paid({order.id: session.payment_intent}):
+                        pin_to_primary([order.user_id])
+                        self.stdout.write(self.style.SUCCESS(f'Updated order {order.id} to paid'))
+                        updated_count += 1
                 else:
+                    Order.objects.filter(id=order.id, status__in=PAYABLE_STATUSES).update(last_checked_at=Now())
                     self.stdout.write(f'  Order {order.id} payment status: {session.payment_status}')
             
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'Error checking order {order.id}: {e}'))
         
         self.stdout.write(self.style.SUCCESS(f'\nUpdated {updated_count} order(s) to paid status.'))
+        cache_stats = stats()
+        self.stdout.write(f'Session cache: {cache_stats["hits"]} hit(s), {cache_stats["misses"]} miss(es)')
+
+
+    def handle_concurrent(self, options):
+        def progress(totals):
+            self.stdout.write(
+                f'  checked {totals["checked"]}, paid {totals["paid"]}, '
+                f'errors {totals["errors"]} (cursor: order {totals["cursor"]})'
+            )
+
+        totals = reconcile_pending_orders(
+            workers=options['workers'],
+            rate=options['rate'],
+            chunk_size=options['chunk_size'],
+            restart=options['restart'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'\nUpdated {totals["paid"]} order(s) to paid status '
+            f'({totals["checked"]} checked, {totals["errors"]} error(s)).'
+        ))
+        cache_stats = stats()
+        self.stdout.write(f'Session cache: {cache_stats["hits"]} hit(s), {cache_stats["misses"]} miss(es)')
 
+    def handle_from_list(self, options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        self.stdout.write(f'Listing completed Stripe sessions created since {since:%Y-%m-%d %H:%M} UTC...')
+        result = reconcile_from_session_list(
+            since,
+            progress=lambda seen: self.stdout.write(f'  {seen} session(s) listed'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'\nUpdated {result["paid"]} order(s) to paid status ({result["sessions"]} session(s) listed).'
+        ))
@@ -0,0 +1,135 @@
+"""Prometheus metrics for the payment pipeline, served at /metrics.
+
+Recorded in-process (cheap per-process counters; with PROMETHEUS_MULTIPROC_DIR
+set, each worker writes its own mmap file and /metrics sums them at scrape time):
+
+- store_checkout_seconds: create_checkout_session latency, by result
+- store_stripe_request_seconds / store_stripe_errors_total: every Stripe
+  gateway call, by operation (and error class); StoreConfig.ready registers
+  record_stripe_call with the gateway, so management commands record them too
+
+Read from the database once per scrape:
+
+- store_pending_orders: pending orders by age bucket
+- store_webhook_events_unprocessed / store_webhook_lag_seconds: size and age
+  of the webhook backlog
+- store_reconcile_backlog / store_checkout_outbox_pending: orders queued for a
+  Stripe check and checkouts waiting for their session
+"""
+from datetime import timedelta
+from functools import wraps
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+from .models import CheckoutOutbox, Order, WebhookEvent
+
+CHECKOUT_SECONDS = Histogram(
+    'store_checkout_seconds', 'create_checkout_session latency', ['result'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+STRIPE_SECONDS = Histogram(
+    'store_stripe_request_seconds', 'Stripe API call latency', ['operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+STRIPE_ERRORS = Counter('store_stripe_errors_total', 'Failed Stripe API calls', ['operation', 'error'])
+
+# (label, minimum age) of the pending-order age buckets
+PENDING_AGE_BUCKETS = (
+    ('lt_5m', timedelta(0)),
+    ('5m_30m', timedelta(minutes=5)),
+    ('30m_2h', timedelta(minutes=30)),
+    ('2h_24h', timedelta(hours=2)),
+    ('gt_24h', timedelta(hours=24)),
+)
+
+
+def record_stripe_call(operation, seconds, error):
+    """Stripe gateway observer (see StoreConfig.ready)."""
+    STRIPE_SECONDS.labels(operation).observe(seconds)
+    if error is not None:
+        STRIPE_ERRORS.labels(operation, type(error).__name__).inc()
+
+
+def time_checkout(view):
+    """Record the view's latency in store_checkout_seconds (sync or async views)."""
+    def observe(started, response):
+        result = 'ok' if response.status_code < 400 else 'error'
+        CHECKOUT_SECONDS.labels(result).observe(time.perf_counter() - started)
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            started = time.perf_counter()
+            response = await view(request, *args, **kwargs)
+            observe(started, response)
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        started = time.perf_counter()
+        response = view(request, *args, **kwargs)
+        observe(started, response)
+        return response
+    return wrapper
+
+
+class PipelineCollector:
+    """Gauges read from the database at scrape time (a handful of indexed aggregates)."""
+
+    def collect(self):
+        now = timezone.now()
+
+        buckets = {}
+        for i, (label, min_age) in enumerate(PENDING_AGE_BUCKETS):
+            condition = Q(created_at__lte=now - min_age)
+            if i + 1 < len(PENDING_AGE_BUCKETS):
+                condition &= Q(created_at__gt=now - PENDING_AGE_BUCKETS[i + 1][1])
+            buckets[label] = Count('id', filter=condition)
+        pending = Order.objects.filter(status='pending').aggregate(**buckets)
+        gauge = GaugeMetricFamily('store_pending_orders', 'Pending orders by age', labels=['age'])
+        for label, _ in PENDING_AGE_BUCKETS:
+            gauge.add_metric([label], pending[label])
+        yield gauge
+
+        webhooks = WebhookEvent.objects.filter(processed_at__isnull=True).aggregate(
+            count=Count('id'), oldest=Min('received_at'),
+        )
+        yield GaugeMetricFamily('store_webhook_events_unprocessed', 'Stored webhook events not yet processed',
+                                value=webhooks['count'])
+        lag = (now - webhooks['oldest']).total_seconds() if webhooks['oldest'] else 0
+        yield GaugeMetricFamily('store_webhook_lag_seconds', 'Age of the oldest unprocessed webhook event',
+                                value=lag)
+
+        reconcile = Order.objects.filter(reconcile_requested_at__isnull=False).aggregate(
+            count=Count('id'), oldest=Min('reconcile_requested_at'),
+        )
+        yield GaugeMetricFamily('store_reconcile_backlog', 'Orders queued for a Stripe check',
+                                value=reconcile['count'])
+        yield GaugeMetricFamily(
+            'store_reconcile_backlog_age_seconds', 'Age of the oldest queued reconciliation request',
+            value=max((now - reconcile['oldest']).total_seconds(), 0) if reconcile['oldest'] else 0,
+        )
+        yield GaugeMetricFamily('store_checkout_outbox_pending', 'Checkouts waiting for their Stripe session',
+                                value=CheckoutOutbox.objects.filter(status='pending').count())
+
+
+def render_latest():
+    """Return (body, content type) for a scrape."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        body = generate_latest(registry)
+    else:
+        body = generate_latest(REGISTRY)
+    database = CollectorRegistry()
+    database.register(PipelineCollector())
+    return body + generate_latest(database), CONTENT_TYPE_LATEST
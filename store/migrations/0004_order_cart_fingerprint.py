@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_order_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='cart_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['cart_fingerprint', 'created_at'], name='order_cart_fp_created_idx'),
+        ),
+    ]
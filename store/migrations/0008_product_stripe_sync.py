@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_webhook_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stripe_synced_hash',
+            field=models.CharField(blank=True, help_text='stripe_content_hash() when the Stripe Product was last updated', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stripe_synced_price',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Amount of stripe_price_id', max_digits=10, null=True),
+        ),
+    ]
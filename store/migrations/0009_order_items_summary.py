@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:26
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+SUMMARY_MAX_ITEMS = 5  # store.models.ORDER_SUMMARY_MAX_ITEMS at the time of this migration
+
+
+def backfill_summaries(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    last_id = 0
+    while True:
+        orders = list(Order.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not orders:
+            break
+        last_id = orders[-1].id
+        items = {}
+        for order_id, name, quantity, price in (
+            OrderItem.objects.filter(order__in=orders)
+            .order_by('order_id', 'id')
+            .values_list('order_id', 'product__name', 'quantity', 'price')
+        ):
+            items.setdefault(order_id, []).append((name, quantity, price))
+        for order in orders:
+            order_items = items.get(order.id, [])
+            order.item_count = len(order_items)
+            order.items_summary = [
+                {'name': name, 'quantity': quantity, 'price': str(price)}
+                for name, quantity, price in order_items[:SUMMARY_MAX_ITEMS]
+            ]
+        Order.objects.bulk_update(orders, ['item_count', 'items_summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_stripe_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of line items'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_summary',
+            field=models.JSONField(blank=True, default=list, help_text='First line items as {name, quantity, price}'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,25 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+import hashlib
+
+
+def cart_fingerprint(cart):
+    """Canonical hash of a cart given as (product_id, quantity) pairs."""
+    canonical = ','.join(f'{product_id}:{quantity}' for product_id, quantity in sorted(cart))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+# Line items kept in Order.items_summary; the rest only count towards item_count
+ORDER_SUMMARY_MAX_ITEMS = 5
+
+
+def order_items_summary(items):
+    """Order.items_summary for (product name, quantity, unit price) triples."""
+    return [
+        {'name': name, 'quantity': quantity, 'price': str(price)}
+        for name, quantity, price in items[:ORDER_SUMMARY_MAX_ITEMS]
+    ]
 
 
 class Product(models.Model):
@@ -11,6 +30,12 @@ class Product(models.Model):
     stripe_price_id = models.CharField(max_length=200, blank=True, help_text="Stripe Price ID (optional)")
     image_url = models.URLField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Written by sync_stripe_catalog: what Stripe currently has for this product
+    stripe_product_id = models.CharField(max_length=200, blank=True)
+    stripe_synced_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                              help_text="Amount of stripe_price_id")
+    stripe_synced_hash = models.CharField(max_length=64, blank=True,
+                                          help_text="stripe_content_hash() when the Stripe Product was last updated")
     
     class Meta:
         ordering = ['name']
@@ -18,6 +43,16 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    def stripe_content_hash(self):
+        """Hash of the fields shown on the Stripe Product."""
+        return hashlib.sha256(f'{self.name}\n{self.description}\n{self.image_url}'.encode()).hexdigest()
+
+    def synced_price_id(self):
+        """The Stripe Price to charge for this product, or '' if Stripe's price is missing or stale."""
+        if self.stripe_price_id and self.stripe_synced_price == self.price:
+            return self.stripe_price_id
+        return ''
+
 
 class Order(models.Model):
     """Order placed by a user."""
@@ -39,11 +74,78 @@ class Order(models.Model):
     # Idempotency key to prevent double charges
     idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
     
+    # Background reconciliation against Stripe (see store.reconciliation)
+    reconcile_requested_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    reconcile_attempts = models.PositiveSmallIntegerField(default=0)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    
+    # Hash of the cart contents, used to spot duplicate submissions (see cart_fingerprint)
+    cart_fingerprint = models.CharField(max_length=64, blank=True, default='')
+    
+    # Written once at checkout so order lists render without loading items and products
+    item_count = models.PositiveIntegerField(default=0, help_text="Number of line items")
+    items_summary = models.JSONField(default=list, blank=True,
+                                     help_text="First line items as {name, quantity, price}")
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['cart_fingerprint', 'created_at'], name='order_cart_fp_created_idx'),
+            # Order history (store.order_history): id breaks created_at ties in the keyset
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='order_user_status_created_idx'),
+            # Pending orders are a small, hot slice of the table (audit_order_queries
+            # checks every Order filter against these)
+            models.Index(fields=['created_at'], name='order_pending_created_idx',
+                         condition=models.Q(status='pending')),
+            models.Index(fields=['id'], name='order_pending_session_idx',
+                         condition=models.Q(status='pending', stripe_session_id__isnull=False)),
+            # Oldest settled orders first, for archive_orders
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # Orders changed since the last rollup_sales run (store.sales_rollup)
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.status} - ${self.total_amount}"
+    
+    @property
+    def items_not_summarized(self):
+        """Line items left out of items_summary."""
+        return max(self.item_count - len(self.items_summary), 0)
+
+
+class CheckoutOutbox(models.Model):
+    """Stripe Checkout Session that still has to be created for an order.
+
+    Written in the same transaction as the order, so the Stripe call itself can
+    happen after commit. Rows left 'pending' are picked up by sweep_checkout_outbox.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    order = models.OneToOneField(Order, related_name='outbox', on_delete=models.CASCADE)
+    payload = models.JSONField(help_text="Arguments for stripe.checkout.Session.create")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='outbox_status_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Outbox for Order #{self.order_id} - {self.status}"
+    
+    @property
+    def stripe_idempotency_key(self):
+        # Stable per order, so retries from the sweeper get the same session back
+        return f"checkout-session-order-{self.order_id}"
 
 
 class OrderItem(models.Model):
@@ -63,3 +165,124 @@ class OrderItem(models.Model):
     def subtotal(self):
         return self.quantity * self.price
 
+
+
+class ArchivedOrder(models.Model):
+    """A settled order moved out of the Order/OrderItem tables by archive_orders.
+    
+    Keeps the original order id, so order history paginates across both tables,
+    and its line items inline as [{product_id, name, quantity, price}].
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='archived_orders')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    stripe_session_id = models.CharField(max_length=255, blank=True)
+    stripe_payment_intent_id = models.CharField(max_length=255, blank=True)
+    items = models.JSONField(default=list)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='archived_user_status_idx'),
+            # rollup_sales: orders changed (then archived) since its last run, and
+            # one day's paid orders when it recomputes that day
+            models.Index(fields=['updated_at'], name='archived_updated_idx'),
+            models.Index(fields=['status', 'created_at'], name='archived_status_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archived order #{self.id} - {self.status} - ${self.total_amount}"
+    
+    # Same interface as Order for the order history templates
+    @property
+    def item_count(self):
+        return len(self.items)
+    
+    @property
+    def items_summary(self):
+        return self.items[:ORDER_SUMMARY_MAX_ITEMS]
+    
+    @property
+    def items_not_summarized(self):
+        return max(len(self.items) - ORDER_SUMMARY_MAX_ITEMS, 0)
+
+
+class WebhookEvent(models.Model):
+    """Stripe webhook event, stored on receipt and processed by process_webhook_events."""
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(
+                fields=['received_at'],
+                name='webhook_unprocessed_idx',
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
+
+
+class SyncCursor(models.Model):
+    """Resumable position of a long-running batch job, keyed by job name."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.position or 'start'}"
+    
+    @classmethod
+    def load(cls, name):
+        """Return the stored position for a job, or '' if it has none."""
+        return cls.objects.filter(name=name).values_list('position', flat=True).first() or ''
+    
+    @classmethod
+    def store(cls, name, position):
+        cls.objects.update_or_create(name=name, defaults={'position': str(position)})
+
+
+class DailySales(models.Model):
+    """Paid orders, units and revenue for one day of order creation (UTC), kept up to date by rollup_sales."""
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'daily sales'
+    
+    def __str__(self):
+        return f"{self.date}: {self.orders} orders, ${self.revenue}"
+
+
+class DailyProductSales(models.Model):
+    """Paid units and revenue of one product for one day, kept up to date by rollup_sales."""
+    date = models.DateField()
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['-date', '-revenue']
+        unique_together = ['date', 'product']
+        verbose_name_plural = 'daily product sales'
+    
+    def __str__(self):
+        return f"{self.date}: {self.units}x {self.product.name}"
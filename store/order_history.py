@@ -0,0 +1,106 @@
+"""Keyset pagination over a user's paid orders, newest first.
+
+A page is "the next `limit` orders after (created_at, id)" rather than an
+OFFSET, so fetching page 1000 costs the same as page 1: one range scan of the
+order_user_status_created_idx index (and of its counterpart on ArchivedOrder)
+plus one query for the page's items. The cursor handed to clients is that
+(created_at, id) pair, base64-encoded.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivedOrder, Order, OrderItem
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order):
+    raw = json.dumps([order.created_at.isoformat(), order.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (created_at, id) encoded in `cursor`. Raises InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, order_id = json.loads(raw)
+        created_at = parse_datetime(created_at)
+    except (binascii.Error, TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None or not isinstance(order_id, int):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, order_id
+
+
+def _after(queryset, position):
+    """Rows strictly after `position` in (-created_at, -id) order."""
+    if position is None:
+        return queryset
+    created_at, order_id = position
+    # Same as (created_at, id) < position: the created_at bound lets the
+    # database start the index scan at the cursor
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id),
+        created_at__lte=created_at,
+    )
+
+
+def paid_orders_after(model, user, position):
+    """A user's paid Order (or ArchivedOrder) rows after `position`, newest first."""
+    return _after(model.objects.filter(user=user, status='paid'), position).order_by('-created_at', '-id')
+
+
+def orders_page(user, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return (orders, next_cursor) for one page; next_cursor is None on the last page.
+
+    Each order is a dict ready for JSON, items included. Archived orders
+    (store.archive) are merged in by the same (created_at, id) key.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    orders = list(
+        paid_orders_after(Order, user, position)
+        .only('id', 'status', 'total_amount', 'created_at', 'item_count')[:limit + 1]
+    )
+    archived = paid_orders_after(ArchivedOrder, user, position)
+    if len(orders) > limit:
+        # Archived rows older than the page's last candidate cannot be on this page
+        archived = archived.filter(created_at__gte=orders[-1].created_at)
+    orders += archived[:limit + 1]
+    orders.sort(key=lambda order: (order.created_at, order.id), reverse=True)
+    has_more = len(orders) > limit
+    page = orders[:limit]
+
+    items = {order.id: order.items for order in page if isinstance(order, ArchivedOrder)}
+    for order_id, product_id, name, quantity, price in (
+        OrderItem.objects.filter(order__in=[order.id for order in page if isinstance(order, Order)])
+        .order_by('order_id', 'id')
+        .values_list('order_id', 'product_id', 'product__name', 'quantity', 'price')
+    ):
+        items.setdefault(order_id, []).append({
+            'product_id': product_id,
+            'name': name,
+            'quantity': quantity,
+            'price': str(price),
+        })
+
+    results = [
+        {
+            'id': order.id,
+            'status': order.status,
+            'total_amount': str(order.total_amount),
+            'created_at': order.created_at.isoformat(),
+            'item_count': order.item_count,
+            'items': items.get(order.id, []),
+        }
+        for order in page
+    ]
+    return results, (encode_cursor(page[-1]) if has_more else None)
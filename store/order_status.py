@@ -0,0 +1,91 @@
+"""Order status lookups for the order status page.
+
+The page waits for the webhook worker or the reconciler to move the order out
+of 'pending'; nothing here calls Stripe. Under ASGI, waiting requests
+(long-poll and Server-Sent Events) register with a per-process
+``StatusWatcher``, which reads the statuses of every awaited order with one
+query per ORDER_STATUS_POLL_INTERVAL, however many browsers are waiting.
+"""
+import asyncio
+import contextvars
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Order
+
+TERMINAL_STATUSES = ('paid', 'failed', 'cancelled')
+
+# Session ids per status query (stays under SQLite's bound parameter limit)
+_QUERY_CHUNK = 500
+
+
+def get_status(session_id):
+    """{'order_id': ..., 'status': ...} for the order of a Checkout Session, or None."""
+    row = Order.objects.filter(stripe_session_id=session_id).values_list('id', 'status').first()
+    return {'order_id': row[0], 'status': row[1]} if row else None
+
+
+def _get_statuses(session_ids):
+    statuses = {}
+    for i in range(0, len(session_ids), _QUERY_CHUNK):
+        statuses.update(
+            (session_id, {'order_id': order_id, 'status': status})
+            for session_id, order_id, status in Order.objects.filter(
+                stripe_session_id__in=session_ids[i:i + _QUERY_CHUNK],
+            ).values_list('stripe_session_id', 'id', 'status')
+        )
+    return statuses
+
+
+class StatusWatcher:
+    """Resolves waiters when their order's status differs from the one they last saw."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._waiters = {}  # session id -> [(known status, future)]
+        self._task = None
+
+    async def wait(self, session_id, known_status, timeout):
+        """Return the order's new status dict, or None if it did not change within `timeout` seconds."""
+        future = asyncio.get_running_loop().create_future()
+        waiter = (known_status, future)
+        self._waiters.setdefault(session_id, []).append(waiter)
+        if self._task is None or self._task.done():
+            # Started from an empty context, so the poll queries are not counted
+            # against whichever request happened to start the task
+            self._task = contextvars.Context().run(asyncio.get_running_loop().create_task, self._poll())
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(session_id, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(session_id, None)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self._waiters:
+                break
+            statuses = await sync_to_async(_get_statuses)(list(self._waiters))
+            for session_id, current in statuses.items():
+                for known_status, future in self._waiters.get(session_id, ()):
+                    if current['status'] != known_status and not future.done():
+                        future.set_result(current)
+
+
+# One watcher per event loop (uvicorn runs one per worker process)
+_watchers = weakref.WeakKeyDictionary()
+
+
+async def await_status_change(session_id, known_status, timeout):
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is None:
+        watcher = _watchers[loop] = StatusWatcher(settings.ORDER_STATUS_POLL_INTERVAL)
+    return await watcher.wait(session_id, known_status, timeout)
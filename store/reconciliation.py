@@ -0,0 +1,320 @@
+"""Background reconciliation of pending orders against Stripe.
+
+Views never call Stripe to confirm payments; they enqueue pending orders here
+and the ``reconcile_orders`` management command drains the queue.
+``reconcile_pending_orders`` and ``reconcile_from_session_list`` are the bulk
+variants used by ``update_paid_orders``.
+
+Besides pending orders, the reconcilers check orders that expire_pending_orders
+cancelled recently: if the expired order's session was in fact paid and the
+webhook never arrived, the payment is still applied.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from . import stripe_gateway
+from .models import Order, SyncCursor
+from .replicas import pin_to_primary
+from .session_cache import get_cached_status, get_session_status, remember
+
+
+# Order statuses a paid Checkout Session still moves to paid
+PAYABLE_STATUSES = ('pending', 'cancelled')
+
+# How long after being cancelled an order is still checked against Stripe
+CANCELLED_RECHECK_WINDOW = timedelta(days=2)
+
+
+def reconcilable(now=None):
+    """Q for orders the bulk reconcilers check.
+
+    Pending orders, plus orders cancelled within CANCELLED_RECHECK_WINDOW that
+    have not been checked since (an expired session never becomes paid, so one
+    check after the cancel is enough).
+    """
+    now = now or timezone.now()
+    return Q(status='pending') | Q(
+        Q(last_checked_at__isnull=True) | Q(last_checked_at__lt=F('updated_at')),
+        status='cancelled', updated_at__gte=now - CANCELLED_RECHECK_WINDOW,
+    )
+
+
+def enqueue_orders(order_ids):
+    """Queue pending orders for a Stripe check. Returns how many were newly queued.
+
+    Orders that are already queued, or were checked less than
+    ORDER_RECONCILE_MIN_INTERVAL seconds ago, are left alone so repeated page
+    loads collapse into a single Stripe lookup.
+    """
+    if not order_ids:
+        return 0
+    now = timezone.now()
+    recheck_cutoff = now - timedelta(seconds=settings.ORDER_RECONCILE_MIN_INTERVAL)
+    return Order.objects.filter(
+        id__in=order_ids,
+        status='pending',
+        stripe_session_id__isnull=False,
+        reconcile_requested_at__isnull=True,
+    ).filter(
+        Q(last_checked_at__isnull=True) | Q(last_checked_at__lt=recheck_cutoff)
+    ).update(reconcile_requested_at=now)
+
+
+# How long a claimed order stays invisible to other workers; a worker that dies
+# mid-check leaves its orders to be claimed again after this
+RECONCILE_LEASE = timedelta(seconds=60)
+
+# Backoff after a failed Stripe check: doubles per attempt, up to the maximum
+RECONCILE_RETRY_DELAY = timedelta(seconds=5)
+RECONCILE_MAX_RETRY_DELAY = timedelta(minutes=5)
+
+
+def due_orders(now):
+    """Queued orders whose Stripe check is due, oldest request first."""
+    return Order.objects.filter(
+        reconcile_requested_at__isnull=False, reconcile_requested_at__lte=now,
+    ).order_by('reconcile_requested_at')
+
+
+def claim_batch(batch_size=50):
+    """Lease up to batch_size due orders from the queue for RECONCILE_LEASE.
+
+    Rows locked by another worker are skipped, so several workers can drain
+    the queue in parallel without checking the same order twice. The orders
+    stay queued until the worker calls check_done or retry_later.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        orders = list(due_orders(now).select_for_update(skip_locked=True)[:batch_size])
+        if orders:
+            Order.objects.filter(id__in=[order.id for order in orders]).update(
+                reconcile_requested_at=now + RECONCILE_LEASE,
+            )
+    return orders
+
+
+def check_done(order):
+    """Take a claimed order off the queue after a successful Stripe check."""
+    Order.objects.filter(id=order.id).update(
+        reconcile_requested_at=None,
+        reconcile_attempts=0,
+        last_checked_at=Now(),
+    )
+
+
+def retry_later(order):
+    """Put a claimed order back on the queue after a failed check. Returns the delay."""
+    delay = min(RECONCILE_RETRY_DELAY * 2 ** order.reconcile_attempts, RECONCILE_MAX_RETRY_DELAY)
+    Order.objects.filter(id=order.id).update(
+        reconcile_requested_at=timezone.now() + delay,
+        reconcile_attempts=F('reconcile_attempts') + 1,
+    )
+    return delay
+
+
+def reconcile_order(order):
+    """Check one order's Checkout Session and mark it paid if Stripe says so.
+
+    Returns True if the order was updated. No transaction is held open while
+    waiting on Stripe; the status change is a conditional UPDATE.
+    """
+    if order.status not in PAYABLE_STATUSES or not order.stripe_session_id:
+        return False
+    session = get_session_status(order.stripe_session_id)
+    if session.payment_status != 'paid':
+        return False
+    updated = mark_paid({order.id: session.payment_intent})
+    if updated:
+        pin_to_primary([order.user_id])
+    return bool(updated)
+
+
+def mark_paid(payment_intents):
+    """Mark orders paid in one UPDATE, given {order_id: payment_intent_id}.
+
+    Only pending or cancelled orders change (PAYABLE_STATUSES), so a concurrent
+    webhook or checkout failure is never overwritten. Returns the number of
+    orders updated. updated_at is stamped by the database as the row is written
+    (rollup_sales relies on it).
+    """
+    if not payment_intents:
+        return 0
+    return Order.objects.filter(id__in=payment_intents, status__in=PAYABLE_STATUSES).update(
+        status='paid',
+        stripe_payment_intent_id=Case(
+            *[When(id=order_id, then=Value(payment_intent)) for order_id, payment_intent in payment_intents.items()],
+            output_field=CharField(),
+        ),
+        last_checked_at=Now(),
+        updated_at=Now(),
+    )
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` calls per second, in bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _fetch_session(order, bucket):
+    """Look up an order's session, cache first. Returns (order, session, error).
+
+    Only a cache miss goes to Stripe and spends a token of the rate limit. The
+    gateway retries 429s and connection errors with jittered backoff.
+    """
+    try:
+        session = get_cached_status(order.stripe_session_id)
+        if session is None:
+            bucket.acquire()
+            session = remember(stripe_gateway.retrieve_checkout_session(order.stripe_session_id))
+        return order, session, None
+    except Exception as e:
+        return order, None, e
+
+
+RECONCILE_CURSOR = 'update_paid_orders'
+
+
+def reconcile_chunk(position, chunk_size, now=None):
+    """The next chunk_size reconcilable orders with a session after order id `position`."""
+    return (
+        Order.objects.filter(reconcilable(now), stripe_session_id__isnull=False, id__gt=position)
+        .order_by('id')
+        .only('id', 'user_id', 'stripe_session_id')[:chunk_size]
+    )
+
+
+def reconcile_pending_orders(workers=8, rate=25, chunk_size=500, restart=False, progress=None):
+    """Check every pending order (and recently cancelled one) against Stripe in keyset-ordered chunks.
+
+    Sessions are fetched by a bounded thread pool throttled to `rate` requests
+    per second. Each chunk is applied with one conditional UPDATE for paid
+    orders (mark_paid) and one UPDATE stamping last_checked_at on the rest. The
+    last processed order id is stored in SyncCursor after every chunk, so an
+    interrupted run resumes where it stopped unless `restart` is set; the cursor
+    never moves past an order whose check failed, so the next run retries it.
+    `progress` is called with a dict of running totals after every chunk.
+    Returns the final totals.
+    """
+    last_id = 0 if restart else int(SyncCursor.load(RECONCILE_CURSOR) or 0)
+    position = last_id
+    first_error = None
+    bucket = TokenBucket(rate)
+    totals = {'checked': 0, 'paid': 0, 'errors': 0, 'cursor': last_id}
+    started = timezone.now()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunk = list(reconcile_chunk(position, chunk_size, started))
+            if not chunk:
+                break
+
+            paid, checked_ids, user_ids = {}, [], []
+            for order, session, error in pool.map(lambda order: _fetch_session(order, bucket), chunk):
+                if error is not None:
+                    totals['errors'] += 1
+                    if first_error is None:
+                        first_error = order.id
+                    continue
+                checked_ids.append(order.id)
+                if session.payment_status == 'paid':
+                    paid[order.id] = session.payment_intent
+                    user_ids.append(order.user_id)
+
+            with transaction.atomic():
+                updated = mark_paid(paid)
+                Order.objects.filter(id__in=checked_ids, status__in=PAYABLE_STATUSES).update(last_checked_at=Now())
+                position = chunk[-1].id
+                last_id = position if first_error is None else first_error - 1
+                SyncCursor.store(RECONCILE_CURSOR, last_id)
+            pin_to_primary(user_ids)
+
+            totals['checked'] += len(checked_ids)
+            totals['paid'] += updated
+            totals['cursor'] = last_id
+            if progress:
+                progress(totals)
+
+    if first_error is None:
+        # Finished a full pass; the next run starts from the beginning
+        SyncCursor.store(RECONCILE_CURSOR, '')
+    return totals
+
+
+# How much earlier than its session an order may have been created: the outbox
+# sweeper can create a session some time after the order was written
+SESSION_ORDER_MARGIN = timedelta(hours=1)
+
+
+def session_list_orders(since, until):
+    """Orders a completed session created in [since, until] can still mark paid."""
+    # Sessions are created right after their order, so the order window can stop at `until`
+    return Order.objects.filter(
+        status__in=PAYABLE_STATUSES, stripe_session_id__isnull=False,
+        created_at__gte=since - SESSION_ORDER_MARGIN, created_at__lte=until,
+    ).only('id', 'user_id', 'stripe_session_id')
+
+
+def reconcile_from_session_list(since, until=None, page_size=100, progress=None):
+    """Mark pending (or cancelled) orders paid by paging through Stripe's session list.
+
+    Lists completed Checkout Sessions created in [since, until] (about one API
+    call per `page_size` sessions) and joins them in memory to the pending and
+    cancelled orders created in the same window (less SESSION_ORDER_MARGIN) by
+    stripe_session_id. Matches are applied with conditional UPDATEs of up to
+    500 orders (mark_paid). `progress` is called with the number of sessions
+    seen after every page. Returns {'sessions': ..., 'paid': ...}.
+    """
+    until = until or timezone.now()
+    pending = {order.stripe_session_id: order for order in session_list_orders(since, until)}
+
+    paid = {}
+    user_ids = []
+    seen = 0
+    sessions = stripe_gateway.iter_checkout_sessions(
+        page_size=page_size,
+        created={'gte': int(since.timestamp()), 'lte': int(until.timestamp())},
+        status='complete',
+    )
+    for session in sessions:
+        seen += 1
+        order = pending.pop(session.id, None)
+        if order is not None and session.payment_status == 'paid':
+            remember(session)
+            paid[order.id] = session.payment_intent
+            user_ids.append(order.user_id)
+        if progress and seen % page_size == 0:
+            progress(seen)
+
+    updated = 0
+    order_ids = list(paid)
+    for start in range(0, len(order_ids), 500):
+        updated += mark_paid({order_id: paid[order_id] for order_id in order_ids[start:start + 500]})
+    pin_to_primary(user_ids)
+    return {'sessions': seen, 'paid': updated}
@@ -0,0 +1,76 @@
+"""Read-replica routing.
+
+Reads go to the primary unless a view opts in with ``replica_reads``: the
+storefront page and the order history API, which only show the catalog and
+paid orders. Everything on the payment path (checkout, idempotency and
+duplicate checks, webhooks, reconciliation, the order status page) keeps
+reading from the primary, where replication lag cannot cause a double order.
+
+A user whose order was just created or confirmed is pinned to the primary for
+DB_PRIMARY_PIN_SECONDS, so their new order shows up on the next page load even
+if the replicas lag behind. Pins live in the default cache, keyed by user id,
+so payments confirmed by the webhook and reconcile workers pin too (with a
+shared cache backend, across processes).
+"""
+from contextvars import ContextVar
+from functools import wraps
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Order
+
+PIN_CACHE_KEY = 'store:primary-pin:{}'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    """Send reads to the replica chosen for the current request (if any), everything else to default."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def pin_to_primary(user_ids):
+    """Read from the primary for the given users' next DB_PRIMARY_PIN_SECONDS."""
+    keys = {PIN_CACHE_KEY.format(user_id): 1 for user_id in user_ids if user_id is not None}
+    if keys and settings.DATABASE_REPLICAS:
+        cache.set_many(keys, timeout=settings.DB_PRIMARY_PIN_SECONDS)
+
+
+def pin_order_users(order_ids):
+    """pin_to_primary for the owners of the given orders."""
+    if order_ids and settings.DATABASE_REPLICAS:
+        pin_to_primary(set(
+            Order.objects.filter(id__in=order_ids, user__isnull=False).values_list('user_id', flat=True)
+        ))
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(PIN_CACHE_KEY.format(user.id)) is not None
+
+
+def replica_reads(view):
+    """Serve the view's reads from a random replica, unless the user is pinned to the primary."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS or is_pinned(request.user):
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
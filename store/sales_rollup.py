@@ -0,0 +1,181 @@
+"""Daily sales rollups (DailySales, DailyProductSales).
+
+Sales are bucketed by the day the order was created. ``rollup_sales`` finds
+orders whose updated_at moved past the watermark stored in SyncCursor. It then
+recomputes each affected day from that day's paid orders, including those
+already moved to ArchivedOrder.
+
+A run therefore costs one day's orders per changed day, and reports read a
+handful of rows per day, however long the order history grows. The watermark
+trails now() by `lag` seconds so that updates still in uncommitted transactions
+are picked up by the next run.
+
+That only holds if updated_at is stamped when the row is written, never from a
+timestamp taken earlier (say, before paging through Stripe). Every status
+change therefore sets ``updated_at=Now()`` in the UPDATE itself, so the
+database clock stamps it; `lag` has to cover the longest such transaction and
+the clock skew between this host and the database.
+"""
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivedOrder, DailyProductSales, DailySales, Order, OrderItem, Product, SyncCursor
+
+ROLLUP_CURSOR = 'sales_rollup'
+MAX_REPORT_DAYS = 366
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+@contextmanager
+def _snapshot():
+    """Run the enclosed reads against one snapshot of the database.
+
+    archive_batch moves orders from Order to ArchivedOrder in one transaction.
+    Read in separate READ COMMITTED statements, an order moved in between would
+    be counted twice (or its items missed), so PostgreSQL reads in a REPEATABLE
+    READ transaction. A SQLite transaction always reads one snapshot.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+def changed_order_days(model, since, until):
+    """Distinct creation days of Order (or ArchivedOrder) rows updated in (since, until]."""
+    orders = model.objects.filter(updated_at__lte=until)
+    if since is not None:
+        orders = orders.filter(updated_at__gt=since)
+    return orders.annotate(day=TruncDate('created_at')).order_by().values_list('day', flat=True).distinct()
+
+
+def paid_orders_of_day(day):
+    """Paid orders created on `day` that are still in Order (rollup_day adds the archived ones)."""
+    start, end = _day_range(day)
+    return Order.objects.filter(status='paid', created_at__gte=start, created_at__lt=end)
+
+
+def changed_days(since, until):
+    """Creation days of orders updated in (since, until]; every order day when since is None."""
+    days = set()
+    # archive_orders keeps updated_at, so an order changed and then archived is still seen
+    for model in (Order, ArchivedOrder):
+        days.update(changed_order_days(model, since, until))
+    if since is None:
+        days.update(DailySales.objects.values_list('date', flat=True))
+    return days
+
+
+def rollup_day(day):
+    """Recompute the rollup rows of one day from its paid orders."""
+    start, end = _day_range(day)
+    with _snapshot():
+        paid = paid_orders_of_day(day)
+        totals = paid.aggregate(orders=Count('id'), revenue=Sum('total_amount'))
+        day_orders = totals['orders']
+        day_revenue = totals['revenue'] or Decimal('0')
+        products = {
+            row['product_id']: row
+            for row in OrderItem.objects.filter(order__in=paid).values('product_id').annotate(
+                orders=Count('order_id'),
+                units=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('price'),
+                            output_field=DecimalField(max_digits=14, decimal_places=2)),
+            )
+        }
+
+        for total_amount, items in (
+            ArchivedOrder.objects.filter(status='paid', created_at__gte=start, created_at__lt=end)
+            .values_list('total_amount', 'items')
+        ):
+            day_orders += 1
+            day_revenue += total_amount
+            for item in items:
+                row = products.setdefault(item['product_id'], {
+                    'product_id': item['product_id'], 'orders': 0, 'units': 0, 'revenue': Decimal('0'),
+                })
+                row['orders'] += 1
+                row['units'] += item['quantity']
+                row['revenue'] += item['quantity'] * Decimal(item['price'])
+
+        # Archived items may name products deleted since
+        existing = set(Product.objects.filter(id__in=products).values_list('id', flat=True))
+
+    with transaction.atomic():
+        DailyProductSales.objects.filter(date=day).delete()
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(date=day, product_id=product_id, orders=row['orders'],
+                              units=row['units'], revenue=row['revenue'])
+            for product_id, row in products.items() if product_id in existing
+        ])
+        if day_orders:
+            DailySales.objects.update_or_create(date=day, defaults={
+                'orders': day_orders,
+                'units': sum(row['units'] for row in products.values()),
+                'revenue': day_revenue,
+            })
+        else:
+            DailySales.objects.filter(date=day).delete()
+
+
+def rollup_sales(lag=60, rebuild=False, progress=None):
+    """Bring the rollups up to date with orders changed since the last run.
+
+    `rebuild` ignores the watermark and recomputes every day. `progress` is
+    called with each recomputed day. Returns {'days': ..., 'watermark': ...}.
+    """
+    until = timezone.now() - timedelta(seconds=lag)
+    since = None if rebuild else parse_datetime(SyncCursor.load(ROLLUP_CURSOR))
+    if since is not None and since >= until:
+        return {'days': 0, 'watermark': since}
+    days = sorted(changed_days(since, until))
+    for day in days:
+        rollup_day(day)
+        if progress:
+            progress(day)
+    # Only advanced once every day is done, so an interrupted run is simply repeated
+    SyncCursor.store(ROLLUP_CURSOR, until.isoformat())
+    return {'days': len(days), 'watermark': until}
+
+
+def sales_report(start, end, top=10):
+    """Daily totals and best-selling products between two dates (inclusive), ready for JSON."""
+    days = [
+        {'date': row['date'].isoformat(), 'orders': row['orders'], 'units': row['units'],
+         'revenue': str(row['revenue'])}
+        for row in DailySales.objects.filter(date__range=(start, end)).order_by('date')
+        .values('date', 'orders', 'units', 'revenue')
+    ]
+    products = [
+        {'product_id': row['product_id'], 'name': row['product__name'], 'orders': row['orders'],
+         'units': row['units'], 'revenue': str(row['revenue'])}
+        for row in DailyProductSales.objects.filter(date__range=(start, end))
+        .values('product_id', 'product__name')
+        .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'product_id')[:top]
+    ]
+    watermark = SyncCursor.load(ROLLUP_CURSOR)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': {
+            'orders': sum(day['orders'] for day in days),
+            'units': sum(day['units'] for day in days),
+            'revenue': str(sum((Decimal(day['revenue']) for day in days), Decimal('0'))),
+        },
+        'days': days,
+        'top_products': products,
+        'as_of': watermark or None,
+    }
@@ -0,0 +1,94 @@
+"""Cache of Checkout Session statuses in front of the Stripe gateway.
+
+The success view, the reconciliation worker and ``update_paid_orders`` all look
+sessions up here instead of calling Stripe each time. Entries live in the
+``stripe_sessions`` cache alias:
+
+- terminal sessions (paid, or expired) never change again and are kept until evicted;
+- other sessions are kept for STRIPE_SESSION_CACHE_TTL seconds.
+
+The size is capped by the alias's MAX_ENTRIES. With LocMemCache and
+CULL_FREQUENCY equal to MAX_ENTRIES, each cull drops only the least recently
+used entry. Hit and miss counts are kept per process (see ``stats``).
+"""
+from collections import namedtuple
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from . import stripe_gateway
+
+CACHE_ALIAS = 'stripe_sessions'
+
+SessionStatus = namedtuple('SessionStatus', ['id', 'status', 'payment_status', 'payment_intent', 'metadata'])
+
+_counters = {'hits': 0, 'misses': 0}
+_counters_lock = threading.Lock()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(session_id):
+    return f'stripe-session:{session_id}'
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def is_terminal(status):
+    return status.payment_status in ('paid', 'no_payment_required') or status.status == 'expired'
+
+
+def remember(session):
+    """Cache a session (Stripe object or plain dict) and return it as a SessionStatus."""
+    metadata = session.get('metadata') or {}
+    status = SessionStatus(
+        id=session['id'],
+        status=session.get('status'),
+        payment_status=session.get('payment_status'),
+        payment_intent=session.get('payment_intent'),
+        metadata=dict(metadata),
+    )
+    timeout = None if is_terminal(status) else settings.STRIPE_SESSION_CACHE_TTL
+    _cache().set(_key(status.id), tuple(status), timeout=timeout)
+    return status
+
+
+def _cached(session_id):
+    cached = _cache().get(_key(session_id))
+    if cached is None:
+        _count('misses')
+        return None
+    _count('hits')
+    return SessionStatus(*cached)
+
+
+def get_cached_status(session_id):
+    """Return the cached SessionStatus of a Checkout Session, or None. Never calls Stripe."""
+    return _cached(session_id)
+
+
+def get_session_status(session_id):
+    """Return the SessionStatus of a Checkout Session, calling Stripe only on a cache miss."""
+    return _cached(session_id) or remember(stripe_gateway.retrieve_checkout_session(session_id))
+
+
+async def aget_session_status(session_id):
+    """Async variant of get_session_status."""
+    status = await sync_to_async(_cached)(session_id)
+    if status is None:
+        session = await stripe_gateway.aretrieve_checkout_session(session_id)
+        status = await sync_to_async(remember)(session)
+    return status
+
+
+def stats():
+    """Return this process's {'hits': ..., 'misses': ...}."""
+    with _counters_lock:
+        return dict(_counters)
@@ -0,0 +1,76 @@
+"""Non-blocking Stripe client for the async views.
+
+Covers only the Checkout Session calls the storefront makes. Requests are
+encoded and errors are raised exactly as the official SDK does, and responses
+are returned as regular ``stripe`` objects, so callers can treat results the
+same way as ``stripe.checkout.Session.create`` / ``retrieve``. Call it through
+``stripe_gateway`` so deadlines, the circuit breaker and metrics apply.
+"""
+import asyncio
+import json
+from urllib.parse import urlencode
+import weakref
+
+import httpx
+import stripe
+from stripe._api_requestor import APIRequestor
+from stripe._encode import _api_encode
+from stripe._error import APIConnectionError
+from stripe._util import convert_to_stripe_object
+from django.conf import settings
+
+# httpx.AsyncClient is bound to the event loop it was first used on
+_clients = weakref.WeakKeyDictionary()
+
+
+def _get_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            base_url=settings.STRIPE_API_BASE or stripe.api_base,
+            headers={
+                'Authorization': f'Bearer {settings.STRIPE_SECRET_KEY}',
+                'Stripe-Version': stripe.api_version,
+            },
+            timeout=settings.STRIPE_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def _request(method, path, params=None, idempotency_key=None):
+    headers = {}
+    if idempotency_key:
+        headers['Idempotency-Key'] = idempotency_key
+    encoded = urlencode(list(_api_encode(params or {})))
+    try:
+        if method == 'get':
+            response = await _get_client().get(f'{path}?{encoded}' if encoded else path, headers=headers)
+        else:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            response = await _get_client().post(path, content=encoded, headers=headers)
+    except httpx.HTTPError as e:
+        raise APIConnectionError(f'Error communicating with Stripe: {e}', should_retry=True)
+
+    try:
+        body = response.json()
+    except json.JSONDecodeError:
+        body = None
+    if not 200 <= response.status_code < 300:
+        # Raises the same StripeError subclass the SDK would
+        APIRequestor(settings.STRIPE_SECRET_KEY).handle_error_response(
+            response.text, response.status_code, body, dict(response.headers)
+        )
+    return convert_to_stripe_object(body, settings.STRIPE_SECRET_KEY)
+
+
+async def create_checkout_session(idempotency_key=None, **params):
+    """Async equivalent of stripe.checkout.Session.create."""
+    return await _request('post', '/v1/checkout/sessions', params, idempotency_key)
+
+
+async def retrieve_checkout_session(session_id):
+    """Async equivalent of stripe.checkout.Session.retrieve."""
+    return await _request('get', f'/v1/checkout/sessions/{session_id}')
@@ -0,0 +1,290 @@
+"""Single entry point for every Stripe API call the store makes.
+
+The gateway configures the Stripe SDK once (key, API host, a pooled keep-alive
+HTTP session) and wraps each call with:
+
+- a deadline (STRIPE_TIMEOUT seconds unless the caller passes one) that covers
+  retries as well as the request itself;
+- retries with full jitter for idempotent reads only; writes rely on Stripe
+  idempotency keys and are never retried here;
+- a process-wide circuit breaker: after STRIPE_BREAKER_THRESHOLD consecutive
+  failures, calls fail fast with StripeUnavailable for STRIPE_BREAKER_RESET seconds;
+- observers that other modules can register with add_observer (store.metrics
+  records every call's latency and errors through one).
+"""
+from contextlib import contextmanager
+import asyncio
+import random
+import threading
+import time
+
+import requests
+import stripe
+from stripe._error import APIConnectionError, APIError, RateLimitError
+from stripe._http_client import RequestsClient
+from django.conf import settings
+
+from . import stripe_async
+
+# Errors worth retrying or counting against the breaker: Stripe was unreachable or unhealthy
+TRANSIENT_ERRORS = (APIConnectionError, APIError, RateLimitError)
+
+
+class StripeUnavailable(APIConnectionError):
+    """Raised without calling Stripe while the circuit breaker is open."""
+
+
+class _DeadlineRequestsClient(RequestsClient):
+    """RequestsClient whose timeout can be narrowed for calls made on the current thread."""
+    _local = threading.local()
+
+    @property
+    def _timeout(self):
+        return getattr(self._local, 'timeout', None) or self._default_timeout
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self._default_timeout = value
+
+    @contextmanager
+    def deadline(self, seconds):
+        previous = getattr(self._local, 'timeout', None)
+        self._local.timeout = max(seconds, 0.001)
+        try:
+            yield
+        finally:
+            self._local.timeout = previous
+
+
+def _build_http_client():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return _DeadlineRequestsClient(timeout=settings.STRIPE_TIMEOUT, session=session)
+
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+if settings.STRIPE_API_BASE:
+    stripe.api_base = settings.STRIPE_API_BASE
+stripe.max_network_retries = 0  # retries are decided below, per operation
+http_client = _build_http_client()
+stripe.default_http_client = http_client
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker shared by all threads of a process."""
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_after:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """Raise StripeUnavailable if calls should not reach Stripe right now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_after:
+                raise StripeUnavailable('Stripe circuit breaker is open; not calling Stripe')
+            # Half-open: let this call through as a probe, and hold the others back
+            self._opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(settings.STRIPE_BREAKER_THRESHOLD, settings.STRIPE_BREAKER_RESET)
+
+_observers = []
+
+
+def add_observer(callback):
+    """Call callback(operation, seconds, error) after every Stripe call (error is None on success)."""
+    _observers.append(callback)
+
+
+def _notify(operation, started, error):
+    seconds = time.monotonic() - started
+    for callback in _observers:
+        callback(operation, seconds, error)
+
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(settings.STRIPE_RETRY_MAX_DELAY, settings.STRIPE_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _call(operation, func, idempotent, timeout=None):
+    """Run func() against Stripe under the deadline, retry policy and circuit breaker."""
+    deadline = time.monotonic() + (timeout or settings.STRIPE_TIMEOUT)
+    max_attempts = 1 + (settings.STRIPE_READ_RETRIES if idempotent else 0)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            with http_client.deadline(deadline - started):
+                result = func()
+        except TRANSIENT_ERRORS as e:
+            breaker.record_failure()
+            _notify(operation, started, e)
+            attempt += 1
+            delay = _backoff(attempt)
+            if attempt >= max_attempts or time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
+            continue
+        except Exception as e:
+            # Stripe answered (bad request, auth...): healthy as far as the breaker is concerned
+            breaker.record_success()
+            _notify(operation, started, e)
+            raise
+        breaker.record_success()
+        _notify(operation, started, None)
+        return result
+
+
+async def _acall(operation, func, idempotent, timeout=None):
+    """Async _call: func is a coroutine function."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (timeout or settings.STRIPE_TIMEOUT)
+    max_attempts = 1 + (settings.STRIPE_READ_RETRIES if idempotent else 0)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(func(), max(deadline - loop.time(), 0.001))
+        except (asyncio.TimeoutError, *TRANSIENT_ERRORS) as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = APIConnectionError(f'Stripe {operation} timed out', should_retry=True)
+            breaker.record_failure()
+            _notify(operation, started, e)
+            attempt += 1
+            delay = _backoff(attempt)
+            if attempt >= max_attempts or loop.time() + delay >= deadline:
+                raise e
+            await asyncio.sleep(delay)
+            continue
+        except Exception as e:
+            breaker.record_success()
+            _notify(operation, started, e)
+            raise
+        breaker.record_success()
+        _notify(operation, started, None)
+        return result
+
+
+def create_checkout_session(idempotency_key, timeout=None, **params):
+    return _call(
+        'create_checkout_session',
+        lambda: stripe.checkout.Session.create(idempotency_key=idempotency_key, **params),
+        idempotent=False,
+        timeout=timeout,
+    )
+
+
+def retrieve_checkout_session(session_id, timeout=None):
+    return _call(
+        'retrieve_checkout_session',
+        lambda: stripe.checkout.Session.retrieve(session_id),
+        idempotent=True,
+        timeout=timeout,
+    )
+
+
+def iter_checkout_sessions(page_size=100, timeout=None, **params):
+    """Yield every Checkout Session matching params, one gateway call per page."""
+    starting_after = None
+    while True:
+        page_params = dict(params, limit=page_size)
+        if starting_after:
+            page_params['starting_after'] = starting_after
+        page = _call(
+            'list_checkout_sessions',
+            lambda: stripe.checkout.Session.list(**page_params),
+            idempotent=True,
+            timeout=timeout,
+        )
+        yield from page.data
+        if not page.has_more or not page.data:
+            return
+        starting_after = page.data[-1].id
+
+
+async def acreate_checkout_session(idempotency_key, timeout=None, **params):
+    return await _acall(
+        'create_checkout_session',
+        lambda: stripe_async.create_checkout_session(idempotency_key=idempotency_key, **params),
+        idempotent=False,
+        timeout=timeout,
+    )
+
+
+async def aretrieve_checkout_session(session_id, timeout=None):
+    return await _acall(
+        'retrieve_checkout_session',
+        lambda: stripe_async.retrieve_checkout_session(session_id),
+        idempotent=True,
+        timeout=timeout,
+    )
+
+
+def create_product(idempotency_key, timeout=None, **params):
+    return _call(
+        'create_product',
+        lambda: stripe.Product.create(idempotency_key=idempotency_key, **params),
+        idempotent=False,
+        timeout=timeout,
+    )
+
+
+def modify_product(product_id, timeout=None, **params):
+    # Setting the same fields again is harmless, so updates may be retried
+    return _call(
+        'modify_product',
+        lambda: stripe.Product.modify(product_id, **params),
+        idempotent=True,
+        timeout=timeout,
+    )
+
+
+def create_price(idempotency_key, timeout=None, **params):
+    return _call(
+        'create_price',
+        lambda: stripe.Price.create(idempotency_key=idempotency_key, **params),
+        idempotent=False,
+        timeout=timeout,
+    )
+
+
+def modify_price(price_id, timeout=None, **params):
+    return _call(
+        'modify_price',
+        lambda: stripe.Price.modify(price_id, **params),
+        idempotent=True,
+        timeout=timeout,
+    )
@@ -0,0 +1,247 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from stripe._error import APIConnectionError
+
+from . import metrics, reconciliation, stripe_gateway
+from .archive import archive_batch
+from .checkout import create_pending_order
+from .expiry import expire_batch
+from .models import CheckoutOutbox, DailySales, Order, Product
+from .order_history import orders_page
+from .reconciliation import mark_paid
+from .sales_rollup import rollup_sales
+from .session_cache import SessionStatus
+
+
+def session_status(session_id, payment_status='paid', payment_intent='pi_test_1'):
+    return SessionStatus(session_id, 'complete' if payment_status == 'paid' else 'open',
+                         payment_status, payment_intent, {})
+
+
+def place_order(user, products, key='key-1'):
+    """create_pending_order for one of each product, as _prepare_checkout calls it."""
+    items = [{'product': product, 'quantity': 1, 'price': product.price} for product in products]
+    return create_pending_order(
+        user, sum(product.price for product in products), key, f'fp-{key}', items,
+        [{'price_data': {'currency': 'inr', 'unit_amount': 1000, 'product_data': {'name': product.name}},
+          'quantity': 1} for product in products],
+        'http://testserver/success/', 'http://testserver/cancel/',
+    )
+
+
+class OrderStatusReconcileTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.order = Order.objects.create(user=self.user, status='pending', total_amount=Decimal('10.00'),
+                                          stripe_session_id='cs_test_status')
+
+    def drain_queue(self, **stub):
+        with mock.patch.object(reconciliation, 'get_session_status', **stub):
+            call_command('reconcile_orders', '--once', stdout=StringIO())
+        self.order.refresh_from_db()
+
+    def test_status_page_queues_pending_order_for_reconciliation(self):
+        response = self.client.get(reverse('order_status_page', args=['cs_test_status']))
+        self.assertEqual(response.status_code, 200)
+        self.drain_queue(return_value=session_status('cs_test_status'))
+        self.assertEqual(self.order.status, 'paid')
+        self.assertEqual(self.order.stripe_payment_intent_id, 'pi_test_1')
+        response = self.client.get(reverse('order_status', args=['cs_test_status']))
+        self.assertEqual(response.json()['status'], 'paid')
+
+    def test_failed_check_is_retried(self):
+        self.client.get(reverse('order_status', args=['cs_test_status']))
+        self.drain_queue(side_effect=RuntimeError('Stripe unavailable'))
+        self.assertEqual(self.order.status, 'pending')
+        self.assertIsNotNone(self.order.reconcile_requested_at)
+        self.assertIsNone(self.order.last_checked_at)
+
+        Order.objects.filter(id=self.order.id).update(reconcile_requested_at=self.order.created_at)
+        self.drain_queue(return_value=session_status('cs_test_status'))
+        self.assertEqual(self.order.status, 'paid')
+        self.assertIsNone(self.order.reconcile_requested_at)
+
+    def test_status_poll_requeues_pending_order(self):
+        self.client.get(reverse('order_status', args=['cs_test_status']))
+        self.drain_queue(return_value=session_status('cs_test_status', payment_status='unpaid'))
+        self.assertIsNone(self.order.reconcile_requested_at)
+
+        with self.settings(ORDER_RECONCILE_MIN_INTERVAL=0):
+            self.client.get(reverse('order_status', args=['cs_test_status']))
+        self.order.refresh_from_db()
+        self.assertIsNotNone(self.order.reconcile_requested_at)
+
+
+class CheckoutQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.products = [
+            Product.objects.create(name=f'Product {n}', description='', price=Decimal('10.00')) for n in range(5)
+        ]
+
+    def test_create_pending_order_query_count_does_not_grow_with_cart(self):
+        for size in (1, 5):
+            with self.subTest(lines=size), self.assertNumQueries(5):
+                place_order(self.user, self.products[:size], key=f'key-{size}')
+
+    def test_checkout_view_query_count_does_not_grow_with_cart(self):
+        self.client.force_login(self.user)
+        for size in (1, 5):
+            cart = [{'product_id': product.id, 'quantity': 1} for product in self.products[:size]]
+            session = mock.Mock(id=f'cs_test_{size}')
+            with self.subTest(lines=size), self.assertNumQueries(14), \
+                    mock.patch.object(stripe_gateway, 'create_checkout_session', return_value=session):
+                response = self.client.post(
+                    reverse('create_checkout_session'),
+                    json.dumps({'items': cart, 'idempotency_key': f'idem-{size}'}),
+                    content_type='application/json',
+                )
+            self.assertEqual(response.json()['sessionId'], f'cs_test_{size}')
+
+
+class CheckoutOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.product = Product.objects.create(name='Mug', description='A mug', price=Decimal('10.00'))
+        self.order, self.outbox = place_order(self.user, [self.product])
+
+    def sweep(self, **stub):
+        with mock.patch.object(stripe_gateway, 'create_checkout_session', **stub) as create:
+            call_command('sweep_checkout_outbox', '--grace', '0', '--max-attempts', '2', stdout=StringIO())
+        self.outbox.refresh_from_db()
+        self.order.refresh_from_db()
+        return create
+
+    def test_retry_reuses_idempotency_key(self):
+        create = self.sweep(side_effect=APIConnectionError('Stripe unreachable'))
+        self.assertEqual(self.outbox.status, 'pending')
+        self.assertEqual(self.outbox.attempts, 1)
+
+        retry = self.sweep(return_value=mock.Mock(id='cs_test_retry'))
+        self.assertEqual(self.outbox.status, 'sent')
+        self.assertEqual(self.order.stripe_session_id, 'cs_test_retry')
+        key = f'checkout-session-order-{self.order.id}'
+        self.assertEqual(create.call_args.kwargs['idempotency_key'], key)
+        self.assertEqual(retry.call_args.kwargs['idempotency_key'], key)
+
+    def test_final_attempt_is_counted_once(self):
+        CheckoutOutbox.objects.filter(id=self.outbox.id).update(attempts=2)
+        self.sweep(side_effect=APIConnectionError('Stripe unreachable'))
+        self.assertEqual(self.outbox.status, 'failed')
+        self.assertEqual(self.outbox.attempts, 3)
+        self.assertEqual(self.order.status, 'failed')
+
+
+class StripeMetricsTests(SimpleTestCase):
+    def test_gateway_observer_registered_at_startup(self):
+        # Registered by StoreConfig.ready, not by importing the views
+        self.assertEqual(stripe_gateway._observers.count(metrics.record_stripe_call), 1)
+
+
+class ExpiryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.product = Product.objects.create(name='Mug', description='', price=Decimal('10.00'))
+        self.now = timezone.now()
+
+    def abandoned_order(self, key, sent_hours_ago=None):
+        """A pending order created 30 hours ago, its session created `sent_hours_ago` (None: never)."""
+        order, outbox = place_order(self.user, [self.product], key=key)
+        Order.objects.filter(id=order.id).update(created_at=self.now - timedelta(hours=30))
+        if sent_hours_ago is not None:
+            CheckoutOutbox.objects.filter(id=outbox.id).update(
+                status='sent', updated_at=self.now - timedelta(hours=sent_hours_ago),
+            )
+        return order, outbox
+
+    def test_skips_orders_whose_session_was_created_after_cutoff(self):
+        late, _ = self.abandoned_order('late', sent_hours_ago=2)
+        expired, _ = self.abandoned_order('expired', sent_hours_ago=29)
+        unsent, unsent_outbox = self.abandoned_order('unsent')
+
+        cancelled = expire_batch(self.now - timedelta(hours=25))
+
+        self.assertCountEqual(cancelled, [expired.id, unsent.id])
+        statuses = dict(Order.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {late.id: 'pending', expired.id: 'cancelled', unsent.id: 'cancelled'})
+        unsent_outbox.refresh_from_db()
+        self.assertEqual(unsent_outbox.status, 'failed')
+
+
+class MarkPaidTests(TestCase):
+    def test_only_pending_and_cancelled_orders_change(self):
+        user = User.objects.create_user('buyer', password='pw')
+        orders = {
+            status: Order.objects.create(user=user, status=status, total_amount=Decimal('10.00'),
+                                         stripe_payment_intent_id='pi_original' if status == 'paid' else None)
+            for status in ('pending', 'cancelled', 'failed', 'paid')
+        }
+
+        updated = mark_paid({order.id: f'pi_{status}' for status, order in orders.items()})
+
+        self.assertEqual(updated, 2)
+        rows = {row[0]: row[1:] for row in Order.objects.values_list('id', 'status', 'stripe_payment_intent_id')}
+        self.assertEqual(rows[orders['pending'].id], ('paid', 'pi_pending'))
+        self.assertEqual(rows[orders['cancelled'].id], ('paid', 'pi_cancelled'))
+        self.assertEqual(rows[orders['failed'].id], ('failed', None))
+        self.assertEqual(rows[orders['paid'].id], ('paid', 'pi_original'))
+
+
+class OrderHistoryArchiveTests(TestCase):
+    def test_cursor_survives_archiving(self):
+        user = User.objects.create_user('buyer', password='pw')
+        now = timezone.now()
+        ids = []
+        for day in range(30):
+            order = Order.objects.create(user=user, status='paid', total_amount=Decimal('10.00'))
+            Order.objects.filter(id=order.id).update(created_at=now - timedelta(days=day))
+            ids.append(order.id)
+
+        seen = []
+        page, cursor = orders_page(user, limit=10)
+        seen += [order['id'] for order in page]
+        # The older half moves to ArchivedOrder between two page loads
+        self.assertEqual(len(archive_batch(now - timedelta(days=14, hours=12))), 15)
+        while cursor:
+            page, cursor = orders_page(user, cursor=cursor, limit=10)
+            seen += [order['id'] for order in page]
+
+        self.assertEqual(seen, ids)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.today = timezone.localdate()
+
+    def order(self, status):
+        return Order.objects.create(user=self.user, status=status, total_amount=Decimal('10.00'))
+
+    def day_orders(self):
+        return DailySales.objects.filter(date=self.today).values_list('orders', flat=True).first()
+
+    def test_watermark_picks_up_later_changes_once(self):
+        self.order('paid')
+        pending = self.order('pending')
+        self.assertEqual(rollup_sales(lag=0)['days'], 1)
+        self.assertEqual(self.day_orders(), 1)
+
+        mark_paid({pending.id: 'pi_test_later'})
+        # Changes newer than now() - lag wait for a later run
+        self.assertEqual(rollup_sales(lag=3600)['days'], 0)
+        self.assertEqual(self.day_orders(), 1)
+
+        self.assertEqual(rollup_sales(lag=0)['days'], 1)
+        self.assertEqual(self.day_orders(), 2)
+        # Nothing changed since the watermark
+        self.assertEqual(rollup_sales(lag=0)['days'], 0)
+        self.assertEqual(self.day_orders(), 2)
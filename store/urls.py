@@ -1,14 +1,39 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI, checkout, success and webhook can be served by their async versions,
+# and the order status endpoint supports long-poll and Server-Sent Events
+if settings.STORE_ASYNC_VIEWS:
+    create_checkout_session_view = views.acreate_checkout_session
+    success_view = views.asuccess
+    stripe_webhook_view = views.astripe_webhook
+    order_status_view = views.aorder_status
+else:
+    create_checkout_session_view = views.create_checkout_session
+    success_view = views.success
+    stripe_webhook_view = views.stripe_webhook
+    order_status_view = views.order_status
+
 urlpatterns = [
     path('', views.home, name='home'),
     path('register/', views.register, name='register'),
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
-    path('create-checkout-session/', views.create_checkout_session, name='create_checkout_session'),
-    path('success/', views.success, name='success'),
+    path('create-checkout-session/', create_checkout_session_view, name='create_checkout_session'),
+    path('success/', success_view, name='success'),
+    path('orders/<str:session_id>/', views.order_status_page, name='order_status_page'),
+    path('api/order-status/<str:session_id>/', order_status_view, name='order_status'),
     path('cancel/', views.cancel, name='cancel'),
-    path('webhook/', views.stripe_webhook, name='stripe_webhook'),
+    path('webhook/', stripe_webhook_view, name='stripe_webhook'),
+    path('api/orders/', views.api_orders, name='api_orders'),
+    path('api/reports/sales/', views.api_sales_report, name='api_sales_report'),
+    path('metrics', views.metrics, name='metrics'),
 ]
 
+
+if settings.STORE_ASYNC_VIEWS:
+    # Each stream holds a connection open, which is only cheap under ASGI
+    urlpatterns.append(
+        path('api/order-status/<str:session_id>/stream/', views.aorder_status_stream, name='order_status_stream'),
+    )
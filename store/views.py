@@ -1,25 +1,39 @@
+from asgiref.sync import sync_to_async
 import stripe
-from stripe._error import InvalidRequestError, StripeError, SignatureVerificationError
+from stripe._error import APIConnectionError, StripeError, SignatureVerificationError
+import logging
 import uuid
 from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
 from decimal import Decimal
 import json
+import time
 
-from .models import Product, Order, OrderItem
+from .catalog import get_products
+from .catalog_sync import unit_amount
+from .metrics import render_latest, time_checkout
+from .checkout import asend_checkout_session, create_pending_order, send_checkout_session
+from .models import ArchivedOrder, CheckoutOutbox, Product, Order, cart_fingerprint
+from .order_history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, orders_page
+from .order_status import TERMINAL_STATUSES, await_status_change, get_status as get_order_status
+from .reconciliation import enqueue_orders
+from .replicas import replica_reads
+from .sales_rollup import MAX_REPORT_DAYS, sales_report
+from .webhooks import arecord_event, record_event
 
-# Initialize Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
 
 
+@replica_reads
 def home(request):
     """Main page showing products and orders."""
     products = Product.objects.all()
@@ -35,66 +49,35 @@ def home(request):
         # For anonymous users, show orders from session (optional - can be empty)
         orders_query = Order.objects.none()
     
-    # If we have a success order_id, make sure it's marked as paid (backup mechanism)
-    if order_id:
-        try:
-            order = Order.objects.get(id=order_id)
-            if order.status != 'paid':
-                # Try to verify with Stripe and update
-                if order.stripe_session_id:
-                    try:
-                        session = stripe.checkout.Session.retrieve(order.stripe_session_id)
-                        if session.payment_status == 'paid':
-                            order.status = 'paid'
-                            order.stripe_payment_intent_id = session.payment_intent
-                            order.save()
-                            print(f"DEBUG: Updated order {order_id} to paid on home page load")
-                    except Exception as e:
-                        print(f"DEBUG: Could not verify order {order_id} with Stripe: {e}")
-        except Order.DoesNotExist:
-            pass
-    
-    # Backup: Check and update any pending orders that have been paid
-    # This ensures orders appear even if success view didn't run
+    # Queue the success order_id and the user's pending orders for a Stripe check
+    # (backup mechanism). The reconcile_orders worker does the Stripe lookups, so
+    # this page only ever renders from the database.
+    reconcile_ids = []
+    if order_id and order_id.isdigit():
+        reconcile_ids.append(int(order_id))
     if request.user.is_authenticated:
-        pending_orders = Order.objects.filter(user=request.user, status='pending', stripe_session_id__isnull=False)
-    else:
-        pending_orders = Order.objects.none()
-    for pending_order in pending_orders[:5]:  # Check last 5 pending orders
-        try:
-            session = stripe.checkout.Session.retrieve(pending_order.stripe_session_id)
-            if session.payment_status == 'paid':
-                pending_order.status = 'paid'
-                pending_order.stripe_payment_intent_id = session.payment_intent
-                pending_order.save()
-                print(f"DEBUG: Auto-updated pending order {pending_order.id} to paid on home page")
-        except Exception as e:
-            # Skip if can't retrieve session
-            pass
-    
-    # Get paid orders, ordered by most recent first
-    orders = orders_query.select_related().prefetch_related('items__product').order_by('-created_at')[:10]
-    
-    # Get the order details for success message
+        reconcile_ids.extend(
+            Order.objects.filter(
+                user=request.user, status='pending', stripe_session_id__isnull=False
+            ).values_list('id', flat=True)[:5]  # Check last 5 pending orders
+        )
+    enqueue_orders(reconcile_ids)
+    
+    # Get paid orders, ordered by most recent first (items come from Order.items_summary),
+    # topped up from the archive for customers whose recent orders are few
+    orders = list(orders_query.order_by('-created_at')[:10])
+    if request.user.is_authenticated and len(orders) < 10:
+        orders += ArchivedOrder.objects.filter(user=request.user, status='paid')[:10 - len(orders)]
+    
+    # Get the order details for success message. Only a paid order gets the
+    # banner: the order status page sends the browser here once the webhook or
+    # the reconciler has confirmed the payment. Read from the primary, since
+    # anonymous checkouts are not pinned and a replica may not have the payment yet.
     success_order = None
-    if payment_success and order_id:
-        try:
-            success_order = Order.objects.prefetch_related('items__product').get(
-                id=order_id, 
-                status='paid'
-            )
-            print(f"DEBUG: Success order found: {success_order.id} with {success_order.items.count()} items")
-        except Order.DoesNotExist:
-            print(f"DEBUG: Order {order_id} not found or not paid")
-            # Try to find it anyway (might have just been updated)
-            try:
-                success_order = Order.objects.prefetch_related('items__product').get(id=order_id)
-                if success_order.status != 'paid':
-                    success_order.status = 'paid'
-                    success_order.save()
-                    print(f"DEBUG: Updated order {order_id} to paid")
-            except Order.DoesNotExist:
-                pass
+    if payment_success and order_id and order_id.isdigit():
+        success_order = Order.objects.using('default').filter(id=order_id, status='paid').first()
+        if success_order is None:
+            logger.debug('Order %s not found or not paid', order_id, extra={'order_id': order_id})
     
     context = {
         'products': products,
@@ -108,261 +91,340 @@ def home(request):
 
 
 @require_http_methods(["POST"])
+@time_checkout
 def create_checkout_session(request):
     """Create a Stripe Checkout session for the order."""
     try:
-        data = json.loads(request.body)
-        items = data.get('items', [])
-        request_idempotency_key = data.get('idempotency_key')  # From frontend
+        prepared = _prepare_checkout(request)
+        if isinstance(prepared, JsonResponse):
+            return prepared
+        return _send_checkout_session(*prepared)
+    
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        logger.exception('Unexpected error creating checkout session')
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@time_checkout
+async def acreate_checkout_session(request):
+    """Async create_checkout_session: waits on Stripe without holding a worker thread."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        # Cart validation and the order transaction are short DB work; run them in a thread
+        prepared = await sync_to_async(_prepare_checkout)(request)
+        if isinstance(prepared, JsonResponse):
+            return prepared
+        return await _asend_checkout_session(*prepared)
+    
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        logger.exception('Unexpected error creating checkout session')
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def _prepare_checkout(request):
+    """Validate the cart and commit the pending order with its outbox row.
+    
+    Returns (outbox, existing) for the Stripe session still to be created, or a
+    JsonResponse when the request is answered without calling Stripe.
+    """
+    data = json.loads(request.body)
+    items = data.get('items', [])
+    request_idempotency_key = data.get('idempotency_key')  # From frontend
+    
+    if not items:
+        return JsonResponse({'error': 'No items provided'}, status=400)
+    
+    # Validate items and calculate total
+    line_items = []
+    total_amount = Decimal('0.00')
+    order_items_data = []
+    
+    cart = []
+    for item in items:
+        product_id = item.get('product_id')
+        quantity = int(item.get('quantity', 0))
         
-        if not items:
-            return JsonResponse({'error': 'No items provided'}, status=400)
+        if quantity <= 0:
+            continue
+        
+        try:
+            cart.append((int(product_id), quantity))
+        except (TypeError, ValueError):
+            return JsonResponse({'error': f'Product {product_id} not found'}, status=400)
+    
+    # Resolve the whole cart at once (one query at most, served from the catalog cache)
+    products = get_products([product_id for product_id, _ in cart])
+    
+    for product_id, quantity in cart:
+        product = products.get(product_id)
+        if product is None:
+            return JsonResponse({'error': f'Product {product_id} not found'}, status=400)
         
-        # Validate items and calculate total
-        line_items = []
-        total_amount = Decimal('0.00')
-        order_items_data = []
+        item_total = product.price * quantity
+        total_amount += item_total
         
-        for item in items:
-            product_id = item.get('product_id')
-            quantity = int(item.get('quantity', 0))
-            
-            if quantity <= 0:
-                continue
-            
-            try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
-                return JsonResponse({'error': f'Product {product_id} not found'}, status=400)
-            
-            item_total = product.price * quantity
-            total_amount += item_total
-            
-            # Add to Stripe line items
+        # Add to Stripe line items: a reference to the synced Stripe Price
+        # (sync_stripe_catalog), or the full price data if it is missing or stale
+        price_id = product.synced_price_id()
+        if price_id:
+            line_items.append({'price': price_id, 'quantity': quantity})
+        else:
             line_items.append({
                 'price_data': {
-                    'currency': 'inr',
+                    'currency': settings.STORE_CURRENCY,
                     'product_data': {
                         'name': product.name,
                         'description': product.description[:500],  # Stripe limit
                     },
-                    'unit_amount': int(product.price * 100),  # Convert to paise (INR smallest unit)
+                    'unit_amount': unit_amount(product.price),  # Convert to paise (INR smallest unit)
                 },
                 'quantity': quantity,
             })
-            
-            order_items_data.append({
-                'product': product,
-                'quantity': quantity,
-                'price': product.price,
-            })
-        
-        if not line_items:
-            return JsonResponse({'error': 'No valid items'}, status=400)
-        
-        # Generate or use provided idempotency key to prevent double charges
-        if request_idempotency_key:
-            idempotency_key = request_idempotency_key
-        else:
-            idempotency_key = str(uuid.uuid4())
-        
-        # Check if an order with this idempotency key already exists
-        existing_order = Order.objects.filter(idempotency_key=idempotency_key).first()
-        if existing_order:
-            # Return existing session if it's still pending
-            if existing_order.status == 'pending' and existing_order.stripe_session_id:
-                return JsonResponse({
-                    'sessionId': existing_order.stripe_session_id,
-                    'order_id': existing_order.id,
-                    'existing': True,
-                })
-            # If order is already paid, return error to prevent duplicate
-            elif existing_order.status == 'paid':
-                return JsonResponse({
-                    'error': 'This order has already been completed',
-                    'order_id': existing_order.id,
-                }, status=400)
-        
-        # Additional protection: Check for recent duplicate requests from same session
-        # (within last 5 seconds with same items)
-        from datetime import timedelta
-        recent_cutoff = timezone.now() - timedelta(seconds=5)
-        recent_orders = Order.objects.filter(
-            created_at__gte=recent_cutoff,
-            total_amount=total_amount,
-            status='pending'
-        )
-        
-        # Check if any recent order has the same items
-        for recent_order in recent_orders:
-            recent_items = set((item.product.id, item.quantity) for item in recent_order.items.all())
-            current_items = set((item['product'].id, item['quantity']) for item in order_items_data)
-            if recent_items == current_items:
-                # Duplicate request detected
-                if recent_order.stripe_session_id:
-                    return JsonResponse({
-                        'sessionId': recent_order.stripe_session_id,
-                        'order_id': recent_order.id,
-                        'existing': True,
-                    })
         
-        # Create order in database first (pending status)
-        with transaction.atomic():
-            order = Order.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                status='pending',
-                total_amount=total_amount,
-                idempotency_key=idempotency_key,
-            )
-            
-            for item_data in order_items_data:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item_data['product'],
-                    quantity=item_data['quantity'],
-                    price=item_data['price'],
-                )
-            
-            # Create Stripe Checkout Session with idempotency
-            try:
-                # Use idempotency key for Stripe API call to prevent duplicate charges
-                checkout_session = stripe.checkout.Session.create(
-                    payment_method_types=['card'],
-                    line_items=line_items,
-                    mode='payment',
-                    success_url=request.build_absolute_uri('/success?session_id={CHECKOUT_SESSION_ID}'),
-                    cancel_url=request.build_absolute_uri('/cancel'),
-                    metadata={
-                        'order_id': str(order.id),
-                        'idempotency_key': idempotency_key,
-                    },
-                    # Stripe idempotency (if supported in your Stripe version)
-                    # idempotency_key=idempotency_key,  # Uncomment if your Stripe version supports this
-                )
-                
-                # Update order with session ID
-                order.stripe_session_id = checkout_session.id
-                order.save()
-                
-                return JsonResponse({
-                    'sessionId': checkout_session.id,
-                    'order_id': order.id,
-                })
-                
-            except StripeError as e:
-                # If Stripe fails, mark order as failed
-                order.status = 'failed'
-                order.save()
-                return JsonResponse({'error': str(e)}, status=400)
+        order_items_data.append({
+            'product': product,
+            'quantity': quantity,
+            'price': product.price,
+        })
     
-    except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON'}, status=400)
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+    if not line_items:
+        return JsonResponse({'error': 'No valid items'}, status=400)
+    
+    # Generate or use provided idempotency key to prevent double charges
+    if request_idempotency_key:
+        idempotency_key = request_idempotency_key
+    else:
+        idempotency_key = str(uuid.uuid4())
+    
+    # Check if an order with this idempotency key already exists
+    existing_order = Order.objects.filter(idempotency_key=idempotency_key).first()
+    if existing_order:
+        # Return existing session if it's still pending
+        if existing_order.status == 'pending' and existing_order.stripe_session_id:
+            return JsonResponse({
+                'sessionId': existing_order.stripe_session_id,
+                'order_id': existing_order.id,
+                'existing': True,
+            })
+        # Session creation for this order was interrupted; finish it with the same outbox row
+        elif existing_order.status == 'pending':
+            outbox = CheckoutOutbox.objects.filter(order=existing_order, status='pending').first()
+            if outbox:
+                return outbox, True
+        # If order is already paid, return error to prevent duplicate
+        elif existing_order.status == 'paid':
+            return JsonResponse({
+                'error': 'This order has already been completed',
+                'order_id': existing_order.id,
+            }, status=400)
+    
+    # Additional protection: Check for recent duplicate requests from same session
+    # (within last 5 seconds with same items), via the indexed cart fingerprint
+    recent_cutoff = timezone.now() - timedelta(seconds=5)
+    fingerprint = cart_fingerprint(cart)
+    recent_order = Order.objects.filter(
+        cart_fingerprint=fingerprint,
+        created_at__gte=recent_cutoff,
+        status='pending',
+        stripe_session_id__isnull=False,
+    ).first()
+    if recent_order:
+        # Duplicate request detected
+        return JsonResponse({
+            'sessionId': recent_order.stripe_session_id,
+            'order_id': recent_order.id,
+            'existing': True,
+        })
+    
+    # Create order in database first (pending status), together with an outbox
+    # row describing the Stripe session. The transaction is committed before
+    # Stripe is called, so no locks are held during the round trip.
+    order, outbox = create_pending_order(
+        user=request.user if request.user.is_authenticated else None,
+        total_amount=total_amount,
+        idempotency_key=idempotency_key,
+        fingerprint=fingerprint,
+        order_items_data=order_items_data,
+        line_items=line_items,
+        success_url=request.build_absolute_uri('/success?session_id={CHECKOUT_SESSION_ID}'),
+        cancel_url=request.build_absolute_uri('/cancel'),
+    )
+    return outbox, False
+
+
+def _send_checkout_session(outbox, existing=False):
+    """Create the Stripe session for a committed outbox row and build the JSON response."""
+    try:
+        session_id = send_checkout_session(outbox)
+    except APIConnectionError as e:
+        # Outcome unknown: the outbox row stays pending and is retried with the same key
+        return JsonResponse({'error': str(e), 'order_id': outbox.order_id}, status=503)
+    except StripeError as e:
+        # Order has been marked as failed
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    response = {
+        'sessionId': session_id,
+        'order_id': outbox.order_id,
+    }
+    if existing:
+        response['existing'] = True
+    return JsonResponse(response)
+
+
+async def _asend_checkout_session(outbox, existing=False):
+    """Async variant of _send_checkout_session."""
+    try:
+        session_id = await asend_checkout_session(outbox)
+    except APIConnectionError as e:
+        return JsonResponse({'error': str(e), 'order_id': outbox.order_id}, status=503)
+    except StripeError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    response = {
+        'sessionId': session_id,
+        'order_id': outbox.order_id,
+    }
+    if existing:
+        response['existing'] = True
+    return JsonResponse(response)
 
 
 def success(request):
-    """Handle successful payment redirect from Stripe."""
-    session_id = request.GET.get('session_id')
+    """Handle successful payment redirect from Stripe.
     
+    Does not call Stripe: the order is queued for a Stripe check and the browser
+    is sent to the order status page, which waits for the webhook worker or the
+    reconciler to confirm the payment.
+    """
+    session_id = _success_session_id(request)
+    if not session_id:
+        return redirect('home')
+    return _success_redirect(session_id)
+
+
+async def asuccess(request):
+    """Async success."""
+    session_id = _success_session_id(request)
     if not session_id:
-        print("DEBUG: No session_id in request")
         return redirect('home')
+    return await sync_to_async(_success_redirect)(session_id)
+
+
+def _success_session_id(request):
+    """Return the session_id from Stripe's success redirect, or None if unusable."""
+    session_id = request.GET.get('session_id')
+    
+    if not session_id:
+        logger.debug('No session_id in success redirect')
+        return None
     
     # Check if session_id is the placeholder (shouldn't happen, but handle it)
     if session_id == '{CHECKOUT_SESSION_ID}' or '{CHECKOUT_SESSION_ID}' in session_id:
-        print("Warning: Received placeholder session_id, redirecting to home")
-        return redirect('home')
+        logger.warning('Received placeholder session_id, redirecting to home')
+        return None
     
-    print(f"DEBUG: Processing success for session_id: {session_id}")
+    logger.debug('Processing success for session %s', session_id, extra={'session_id': session_id})
+    return session_id
+
+
+def _enqueue_if_pending(status):
+    """Queue a still-pending order for a Stripe check (repeats collapse in enqueue_orders)."""
+    if status['status'] == 'pending':
+        enqueue_orders([status['order_id']])
+
+
+def _success_redirect(session_id):
+    """Queue the session's order for a Stripe check and redirect to its status page."""
+    status = get_order_status(session_id)
+    if status is None:
+        logger.warning('No order found for session %s', session_id, extra={'session_id': session_id})
+        return redirect('home')
+    _enqueue_if_pending(status)
+    return redirect('order_status_page', session_id=session_id)
+
+
+def order_status_page(request, session_id):
+    """Page that waits for the order of a Checkout Session to be paid, then returns home."""
+    status = get_order_status(session_id)
+    if status is None:
+        return redirect('home')
+    _enqueue_if_pending(status)
+    return render(request, 'store/order_status.html', {
+        'session_id': session_id,
+        'order_id': status['order_id'],
+        'status': status['status'],
+        'use_sse': settings.STORE_ASYNC_VIEWS,
+        'poll_interval_ms': int(settings.ORDER_STATUS_CLIENT_POLL_INTERVAL * 1000),
+    })
+
+
+@require_http_methods(["GET"])
+def order_status(request, session_id):
+    """Current status of the order of a Checkout Session, as JSON.
+
+    A pending order is queued for a Stripe check on every poll, in case an
+    earlier check failed and the webhook is late or lost.
+    """
+    status = get_order_status(session_id)
+    if status is None:
+        return JsonResponse({'error': 'Order not found'}, status=404)
+    _enqueue_if_pending(status)
+    return JsonResponse(status)
+
+
+async def aorder_status(request, session_id):
+    """Async order_status with long-poll: ?since=<status>&wait=<seconds>.
     
+    Returns as soon as the status differs from `since`, or after `wait` seconds
+    (at most ORDER_STATUS_MAX_WAIT) with the unchanged status.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    status = await sync_to_async(get_order_status)(session_id)
+    if status is None:
+        return JsonResponse({'error': 'Order not found'}, status=404)
+    await sync_to_async(_enqueue_if_pending)(status)
+    since = request.GET.get('since')
     try:
-        # Retrieve the session from Stripe
-        session = stripe.checkout.Session.retrieve(session_id)
-        print(f"DEBUG: Session retrieved - payment_status: {session.payment_status}, metadata: {session.metadata}")
-        
-        # Always try to update order if payment is paid, regardless of current status
-        if session.payment_status == 'paid':
-            # Find the order and lock it to prevent race conditions
-            with transaction.atomic():
-                # Try to find order by session_id first (check both pending and any status)
-                order = Order.objects.select_for_update().filter(
-                    stripe_session_id=session_id
-                ).first()
-                
-                # If not found, try to find by order_id from metadata
-                if not order and session.metadata:
-                    order_id = session.metadata.get('order_id')
-                    print(f"DEBUG: Trying to find order by metadata order_id: {order_id}")
-                    if order_id:
-                        order = Order.objects.select_for_update().filter(
-                            id=order_id
-                        ).first()
-                
-                if order:
-                    print(f"DEBUG: Found order {order.id}, current status: {order.status}")
-                    # Only update if not already paid (prevent duplicate updates on refresh)
-                    if order.status != 'paid':
-                        order.status = 'paid'
-                        order.stripe_payment_intent_id = session.payment_intent
-                        order.save()
-                        print(f"DEBUG: Updated order {order.id} to paid status")
-                    else:
-                        print(f"DEBUG: Order {order.id} already paid, skipping update")
-                    # Redirect with success message
-                    from django.urls import reverse
-                    redirect_url = reverse('home') + f'?payment=success&order_id={order.id}'
-                    print(f"DEBUG: Redirecting to: {redirect_url}")
-                    return redirect(redirect_url)
-                else:
-                    print(f"DEBUG: No order found for session_id: {session_id}")
-                    # Try to find any order with this session_id regardless of status
-                    fallback_order = Order.objects.filter(stripe_session_id=session_id).first()
-                    if fallback_order:
-                        print(f"DEBUG: Found fallback order {fallback_order.id} with status {fallback_order.status}")
-                        fallback_order.status = 'paid'
-                        fallback_order.stripe_payment_intent_id = session.payment_intent
-                        fallback_order.save()
-                        from django.urls import reverse
-                        redirect_url = reverse('home') + f'?payment=success&order_id={fallback_order.id}'
-                        print(f"DEBUG: Redirecting to: {redirect_url}")
-                        return redirect(redirect_url)
-                    else:
-                        # Last resort: try to find by metadata order_id without status check
-                        if session.metadata:
-                            order_id = session.metadata.get('order_id')
-                            if order_id:
-                                print(f"DEBUG: Last resort - trying to find order {order_id} by ID only")
-                                last_resort_order = Order.objects.filter(id=order_id).first()
-                                if last_resort_order:
-                                    print(f"DEBUG: Found last resort order {last_resort_order.id}")
-                                    last_resort_order.status = 'paid'
-                                    last_resort_order.stripe_payment_intent_id = session.payment_intent
-                                    if not last_resort_order.stripe_session_id:
-                                        last_resort_order.stripe_session_id = session_id
-                                    last_resort_order.save()
-                                    from django.urls import reverse
-                                    redirect_url = reverse('home') + f'?payment=success&order_id={last_resort_order.id}'
-                                    return redirect(redirect_url)
-        
-        # If payment not confirmed, redirect anyway (webhook will handle it)
-        print(f"DEBUG: Payment status is {session.payment_status}, redirecting to home")
-        return redirect('home')
+        wait = min(float(request.GET.get('wait', 0)), settings.ORDER_STATUS_MAX_WAIT)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid wait'}, status=400)
+    if since == status['status'] and wait > 0:
+        status = await await_status_change(session_id, since, wait) or status
+    return JsonResponse(status)
+
+
+async def aorder_status_stream(request, session_id):
+    """Server-Sent Events: one `status` event now and one per change, until the order is settled."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    status = await sync_to_async(get_order_status)(session_id)
+    if status is None:
+        return JsonResponse({'error': 'Order not found'}, status=404)
+    await sync_to_async(_enqueue_if_pending)(status)
     
-    except InvalidRequestError as e:
-        # Invalid session ID (e.g., placeholder or doesn't exist)
-        print(f"ERROR: Invalid Stripe session ID: {session_id}, error: {e}")
-        return redirect('home')
-    except StripeError as e:
-        # Other Stripe errors
-        print(f"ERROR: Stripe error in success view: {e}")
-        return redirect('home')
-    except Exception as e:
-        # Catch any other unexpected errors
-        print(f"ERROR: Unexpected error in success view: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
-        return redirect('home')
+    async def events(status):
+        yield f'event: status\ndata: {json.dumps(status)}\n\n'
+        deadline = time.monotonic() + settings.ORDER_STATUS_STREAM_TIMEOUT
+        while status['status'] not in TERMINAL_STATUSES and time.monotonic() < deadline:
+            changed = await await_status_change(session_id, status['status'], settings.ORDER_STATUS_MAX_WAIT)
+            if changed is None:
+                await sync_to_async(_enqueue_if_pending)(status)
+                yield ': keep-alive\n\n'
+            else:
+                status = changed
+                yield f'event: status\ndata: {json.dumps(status)}\n\n'
+    
+    response = StreamingHttpResponse(events(status), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
 
 
 def cancel(request):
@@ -370,9 +432,82 @@ def cancel(request):
     return redirect('home')
 
 
+@require_http_methods(["GET"])
+@replica_reads
+def api_orders(request):
+    """Paid orders of the logged-in user, newest first: ?limit=<n>&cursor=<next_cursor>."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    try:
+        orders, next_cursor = orders_page(request.user, request.GET.get('cursor'), limit)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'orders': orders, 'next_cursor': next_cursor})
+
+
+@require_http_methods(["GET"])
+@replica_reads
+def api_sales_report(request):
+    """Paid sales per day and top products from the rollup tables: ?start=YYYY-MM-DD&end=YYYY-MM-DD (staff only)."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    try:
+        end = parse_date(request.GET['end']) if 'end' in request.GET else timezone.now().date()
+        start = parse_date(request.GET['start']) if 'start' in request.GET else end - timedelta(days=29)
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+    if start > end or (end - start).days >= MAX_REPORT_DAYS:
+        return JsonResponse({'error': f'Invalid range (at most {MAX_REPORT_DAYS} days)'}, status=400)
+    return JsonResponse(sales_report(start, end))
+
+
+def metrics(request):
+    """Prometheus scrape endpoint. Requires `Authorization: Bearer <METRICS_TOKEN>` when the token is set."""
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponse(status=401)
+    body, content_type = render_latest()
+    return HttpResponse(body, content_type=content_type)
+
+
 @csrf_exempt
 def stripe_webhook(request):
     """Handle Stripe webhook events for additional security."""
+    event = _construct_webhook_event(request)
+    if isinstance(event, HttpResponse):
+        return event
+    
+    # Record the event and acknowledge; process_webhook_events applies it.
+    # Retried deliveries of the same event are ignored by the unique event id.
+    record_event(event.to_dict_recursive())
+    
+    return HttpResponse(status=200)
+
+
+async def astripe_webhook(request):
+    """Async stripe_webhook."""
+    event = _construct_webhook_event(request)
+    if isinstance(event, HttpResponse):
+        return event
+    
+    await arecord_event(event.to_dict_recursive())
+    
+    return HttpResponse(status=200)
+
+
+# csrf_exempt only wraps sync views in Django 4.2
+astripe_webhook.csrf_exempt = True
+
+
+def _construct_webhook_event(request):
+    """Verify the Stripe signature. Returns the event, or the HttpResponse to send instead."""
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     
@@ -381,35 +516,13 @@ def stripe_webhook(request):
         return HttpResponse(status=200)
     
     try:
-        event = stripe.Webhook.construct_event(
+        return stripe.Webhook.construct_event(
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
         )
     except ValueError:
         return HttpResponse(status=400)
     except SignatureVerificationError:
         return HttpResponse(status=400)
-    
-    # Handle the event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        order_id = session.get('metadata', {}).get('order_id')
-        
-        if order_id:
-            try:
-                with transaction.atomic():
-                    order = Order.objects.select_for_update().filter(
-                        id=order_id,
-                        status='pending'
-                    ).first()
-                    
-                    if order:
-                        order.status = 'paid'
-                        order.stripe_payment_intent_id = session.get('payment_intent')
-                        order.save()
-            except Order.DoesNotExist:
-                pass
-    
-    return HttpResponse(status=200)
 
 
 def register(request):
@@ -0,0 +1,74 @@
+"""Stripe webhook event log.
+
+The webhook endpoint only verifies and records events (one indexed INSERT,
+duplicates ignored); ``process_webhook_events`` applies them in batches.
+"""
+from django.db import transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .models import Order, WebhookEvent
+from .reconciliation import PAYABLE_STATUSES
+from .replicas import pin_order_users
+from .session_cache import remember
+
+
+def record_event(event):
+    """Store a verified Stripe event (as a plain dict). Duplicate deliveries are ignored."""
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event['id'], type=event['type'], payload=event)],
+        ignore_conflicts=True,
+    )
+
+
+async def arecord_event(event):
+    """Async variant of record_event."""
+    await WebhookEvent.objects.abulk_create(
+        [WebhookEvent(event_id=event['id'], type=event['type'], payload=event)],
+        ignore_conflicts=True,
+    )
+
+
+def handle_event(event):
+    """Apply one stored event to the orders it refers to."""
+    if event.type == 'checkout.session.completed':
+        session = event.payload['data']['object']
+        remember(session)
+        order_id = (session.get('metadata') or {}).get('order_id')
+        # An order cancelled by expire_pending_orders can still be paid for
+        if order_id and Order.objects.filter(id=order_id, status__in=PAYABLE_STATUSES).update(
+            status='paid',
+            stripe_payment_intent_id=session.get('payment_intent'),
+            updated_at=Now(),
+        ):
+            pin_order_users([order_id])
+
+
+def process_batch(batch_size=100, max_attempts=5):
+    """Apply up to batch_size unprocessed events. Returns (processed, failed).
+
+    Events are locked with SKIP LOCKED, so several workers can drain the log in
+    parallel. A failing event is retried on later batches until max_attempts.
+    """
+    processed = failed = 0
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=max_attempts)
+            .order_by('received_at')[:batch_size]
+        )
+        for event in events:
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    handle_event(event)
+            except Exception as e:
+                event.last_error = str(e)
+                failed += 1
+            else:
+                event.processed_at = timezone.now()
+                event.last_error = ''
+                processed += 1
+        if events:
+            WebhookEvent.objects.bulk_update(events, ['processed_at', 'attempts', 'last_error'])
+    return processed, failed
@@ -0,0 +1,96 @@
+"""Logging pieces referenced from settings.LOGGING.
+
+- ``QueueStreamHandler``: request threads only format the record and put it on
+  a bounded queue; a background thread does the stream write. When the queue is
+  full the record is dropped (and counted) instead of blocking the request.
+- ``SamplingFilter``: keeps a configurable fraction of records per logger.
+  WARNING and above are always kept.
+- ``JsonFormatter``: one JSON object per line, including any ``extra`` fields.
+"""
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                    .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep `rates[logger]` of the records below WARNING; the closest configured parent logger applies."""
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+        self._resolved = {}
+
+    def _rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            parts = name.split('.')
+            for i in range(len(parts), 0, -1):
+                candidate = '.'.join(parts[:i])
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class QueueStreamHandler(logging.handlers.QueueHandler):
+    """Format on the calling thread, write to `stream` (default stderr) from a background thread."""
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.stream = stream
+        self.dropped = 0
+        self._start_listener()
+        # A forked worker (e.g. gunicorn --preload) inherits the queue but not the thread
+        os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def _start_listener(self):
+        target = logging.StreamHandler(self.stream)
+        target.setFormatter(logging.Formatter('%(message)s'))
+        self.listener = logging.handlers.QueueListener(self.queue, target)
+        self.listener.start()
+
+    def _restart_in_child(self):
+        self.queue = queue.Queue(self.queue.maxsize)
+        self._start_listener()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # Flushes what is queued; called by logging.shutdown() at exit
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
@@ -0,0 +1,160 @@
+"""Per-request performance instrumentation.
+
+``PerformanceMiddleware`` measures, for a sample of requests (PERF_SAMPLE_RATE):
+
+- wall time;
+- ORM query count and time, through a query execute wrapper;
+- Stripe API call count and time, through the Stripe gateway's observers;
+- template render time.
+
+Results go out as a ``Server-Timing`` header (PERF_SERVER_TIMING) and one log
+record on the ``stripe_app.perf`` logger. The counters live in a context
+variable, so queries made from ``sync_to_async`` threads under ASGI are
+attributed to the request that made them.
+"""
+from contextvars import ContextVar
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template as DjangoTemplate
+
+from store import stripe_gateway
+
+logger = logging.getLogger('stripe_app.perf')
+
+_current = ContextVar('request_timings', default=None)
+_installed = False
+
+
+class RequestTimings:
+    __slots__ = ('started', 'db_queries', 'db_seconds', 'stripe_calls', 'stripe_seconds', 'template_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.stripe_calls = 0
+        self.stripe_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_queries += 1
+        timings.db_seconds += time.perf_counter() - started
+
+
+def _add_query_wrapper(sender, connection, **kwargs):
+    # Every new connection, for every alias and thread, gets the wrapper
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _record_stripe_call(operation, seconds, error):
+    timings = _current.get()
+    if timings is not None:
+        timings.stripe_calls += 1
+        timings.stripe_seconds += seconds
+
+
+_render_template = DjangoTemplate.render
+
+
+def _timed_render(self, context=None, request=None):
+    timings = _current.get()
+    if timings is None:
+        return _render_template(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _render_template(self, context, request)
+    finally:
+        timings.template_seconds += time.perf_counter() - started
+
+
+def _install():
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_add_query_wrapper)
+    stripe_gateway.add_observer(_record_stripe_call)
+    # Top-level renders only: {% include %} and {% extends %} render inside this call
+    DjangoTemplate.render = _timed_render
+
+
+class PerformanceMiddleware:
+    """Server-Timing header and a perf log line for sampled requests. Place it first in MIDDLEWARE."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._report(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._report(request, response, timings)
+        return response
+
+    def _sampled(self):
+        rate = settings.PERF_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def _report(self, request, response, timings):
+        total_ms = (time.perf_counter() - timings.started) * 1000
+        metrics = {
+            'total_ms': round(total_ms, 2),
+            'db_queries': timings.db_queries,
+            'db_ms': round(timings.db_seconds * 1000, 2),
+            'stripe_calls': timings.stripe_calls,
+            'stripe_ms': round(timings.stripe_seconds * 1000, 2),
+            'template_ms': round(timings.template_seconds * 1000, 2),
+        }
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={metrics["total_ms"]}',
+                f'db;dur={metrics["db_ms"]};desc="{timings.db_queries} queries"',
+                f'stripe;dur={metrics["stripe_ms"]};desc="{timings.stripe_calls} calls"',
+                f'template;dur={metrics["template_ms"]}',
+            ])
+        logger.info(
+            '%s %s %s total=%.1fms db=%d/%.1fms stripe=%d/%.1fms template=%.1fms',
+            request.method, request.path, response.status_code, total_ms,
+            timings.db_queries, timings.db_seconds * 1000,
+            timings.stripe_calls, timings.stripe_seconds * 1000,
+            timings.template_seconds * 1000,
+            extra={'method': request.method, 'path': request.path, 'status': response.status_code, **metrics},
+        )
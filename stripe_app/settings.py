@@ -38,6 +38,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'stripe_app.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +83,54 @@ DATABASES = {
     }
 }
 
+# Read replicas (store/replicas.py): comma-separated host[:port] list. Each becomes a
+# `replica_<n>` alias with the primary's database name and credentials. Views using
+# `replica_reads` (the storefront page, the order history API) read from them.
+DATABASE_REPLICAS = []
+for _n, _host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    _host, _, _port = _host.strip().partition(':')
+    DATABASES[f'replica_{_n}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_n}')
+
+DATABASE_ROUTERS = ['store.replicas.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after their checkout or payment confirmation
+DB_PRIMARY_PIN_SECONDS = int(os.getenv('DB_PRIMARY_PIN_SECONDS', '15'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The product catalog cache (store.catalog) keeps its version here, and replica
+# reads (store/replicas.py) their primary pins. Use a shared backend (the database
+# cache in docker-compose, Redis, Memcached) when running more than one process,
+# including management commands that change products.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    # Checkout Session statuses (store/session_cache.py); CULL_FREQUENCY == MAX_ENTRIES
+    # makes LocMemCache evict only the least recently used entry when full
+    'stripe_sessions': {
+        'BACKEND': os.getenv('STRIPE_SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('STRIPE_SESSION_CACHE_LOCATION', 'stripe-sessions'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('STRIPE_SESSION_CACHE_SIZE', '10000')),
+            'CULL_FREQUENCY': int(os.getenv('STRIPE_SESSION_CACHE_SIZE', '10000')),
+        },
+    },
+}
+
+
+# Seconds a process keeps its product snapshot even if no catalog version bump reaches it
+CATALOG_SNAPSHOT_TTL = int(os.getenv('CATALOG_SNAPSHOT_TTL', '30'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -129,4 +178,78 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+# Currency of product prices and Stripe charges
+STORE_CURRENCY = os.getenv('STORE_CURRENCY', 'inr')
+# Override the Stripe API host (e.g. a local stand-in); empty means api.stripe.com
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', '')
+# Deadline in seconds for one Stripe operation, retries included (store/stripe_gateway.py)
+STRIPE_TIMEOUT = float(os.getenv('STRIPE_TIMEOUT', '10'))
+# Keep-alive connections kept open to Stripe per process
+STRIPE_HTTP_POOL_SIZE = int(os.getenv('STRIPE_HTTP_POOL_SIZE', '20'))
+# Extra attempts for reads (retrieve/list); writes are never retried by the gateway
+STRIPE_READ_RETRIES = int(os.getenv('STRIPE_READ_RETRIES', '2'))
+STRIPE_RETRY_BASE_DELAY = float(os.getenv('STRIPE_RETRY_BASE_DELAY', '0.25'))
+STRIPE_RETRY_MAX_DELAY = float(os.getenv('STRIPE_RETRY_MAX_DELAY', '2'))
+# Consecutive failures that open the circuit breaker, and seconds before it lets a probe through
+STRIPE_BREAKER_THRESHOLD = int(os.getenv('STRIPE_BREAKER_THRESHOLD', '5'))
+STRIPE_BREAKER_RESET = float(os.getenv('STRIPE_BREAKER_RESET', '30'))
+# Seconds a session that is not yet paid or expired stays in the session cache
+STRIPE_SESSION_CACHE_TTL = int(os.getenv('STRIPE_SESSION_CACHE_TTL', '10'))
+
+# Serve checkout, success and webhook with the async views (set when running under ASGI)
+STORE_ASYNC_VIEWS = os.getenv('STORE_ASYNC_VIEWS', 'False') == 'True'
+
+# Order status page (store/order_status.py): seconds between browser polls under
+# WSGI; under ASGI, the longest long-poll, how often waiting requests re-read
+# order statuses (one query per process for all of them) and how long an SSE
+# stream stays open
+ORDER_STATUS_CLIENT_POLL_INTERVAL = float(os.getenv('ORDER_STATUS_CLIENT_POLL_INTERVAL', '2'))
+ORDER_STATUS_MAX_WAIT = float(os.getenv('ORDER_STATUS_MAX_WAIT', '25'))
+ORDER_STATUS_POLL_INTERVAL = float(os.getenv('ORDER_STATUS_POLL_INTERVAL', '1'))
+ORDER_STATUS_STREAM_TIMEOUT = float(os.getenv('ORDER_STATUS_STREAM_TIMEOUT', '300'))
+
+
+# Per-request timings (stripe_app/middleware.py): fraction of requests measured
+# (e.g. 0.01 in production) and whether they get a Server-Timing header
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', '1.0'))
+PERF_SERVER_TIMING = os.getenv('PERF_SERVER_TIMING', 'True') == 'True'
+
+# Logs go out as JSON lines through a queue, so request threads never block on
+# stdout (stripe_app/log.py). LOG_SAMPLING keeps a fraction of each logger's
+# records below WARNING, e.g. {'stripe_app.perf': 0.1}.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLING = {
+    'store': float(os.getenv('STORE_LOG_SAMPLE_RATE', '1.0')),
+    'stripe_app.perf': float(os.getenv('PERF_LOG_SAMPLE_RATE', '1.0')),
+}
+
+# Bearer token required by /metrics (empty: open, e.g. when only reachable internally).
+# With several worker processes, also set PROMETHEUS_MULTIPROC_DIR (see README).
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'stripe_app.log.JsonFormatter'},
+    },
+    'filters': {
+        'sampling': {'()': 'stripe_app.log.SamplingFilter', 'rates': LOG_SAMPLING},
+    },
+    'handlers': {
+        'queue': {
+            'class': 'stripe_app.log.QueueStreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json',
+            'filters': ['sampling'],
+        },
+    },
+    'loggers': {
+        'store': {'handlers': ['queue'], 'level': os.getenv('STORE_LOG_LEVEL', LOG_LEVEL), 'propagate': False},
+        'stripe_app': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+        'stripe_app.perf': {'level': os.getenv('PERF_LOG_LEVEL', 'INFO')},
+    },
+}
 
+# Minimum seconds between two Stripe checks of the same pending order
+ORDER_RECONCILE_MIN_INTERVAL = int(os.getenv('ORDER_RECONCILE_MIN_INTERVAL', '30'))